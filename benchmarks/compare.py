@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# compare.py - Compares two benchmark suite result files and flags regressions
+# Run from the repository root: python benchmarks/compare.py <old.json> <new.json> [threshold]
+
+import sys, json
+
+
+def timings(report):
+    '''Returns a dict of (size, benchmark) -> median milliseconds'''
+    flat = {}
+    for size, results in report['sizes'].items():
+        for group in ('query', 'data', 'ui'):
+            for name, timing in (results.get(group) or {}).items():
+                flat[(size, name)] = timing['median_ms']
+    return flat
+
+
+def main():
+    if len(sys.argv) < 3:
+        print('Usage: python benchmarks/compare.py <old.json> <new.json> [threshold]')
+        return 2
+
+    with open(sys.argv[1]) as oldFile, open(sys.argv[2]) as newFile:
+        old, new = json.load(oldFile), json.load(newFile)
+    threshold = float(sys.argv[3]) if len(sys.argv) > 3 else 1.25 # Ratio counted as a regression
+
+    before, after = timings(old), timings(new)
+    print('{} -> {}'.format(old.get('commit'), new.get('commit')))
+    regressions = 0
+    for key in sorted(set(before) & set(after)):
+        ratio = after[key] / before[key] if before[key] > 0 else 1.0
+        flag = ''
+        if ratio > threshold and after[key] - before[key] > 0.05: # Ignore noise on sub-0.05 ms calls
+            flag = '  REGRESSION'
+            regressions += 1
+        print('{:<5} {:<30} {:10.3f} ms {:10.3f} ms {:6.2f}x{}'.format(key[0], key[1], before[key], after[key], ratio, flag))
+
+    for key in sorted(set(after) - set(before)):
+        print('{:<5} {:<30} {:>13} {:10.3f} ms    new'.format(key[0], key[1], '', after[key]))
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# consistency.py - Checks that incrementally maintained summary tables match a full rebuild
+# Run from the repository root: python benchmarks/consistency.py [matches] [seed]
+
+import os, sys, random, shutil, tempfile
+sys.path.insert(0, os.getcwd())
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import league
+from src.data import Data
+
+
+TABLES = ['PlayerStats', 'GameStats', 'HeadToHead', 'Streaks', 'Ratings', 'Glicko']
+
+
+def snapshot(data):
+    '''Returns a dict of table -> sorted rows, floats rounded so replay order noise is ignored'''
+    tables = {}
+    for table in TABLES:
+        rows = data.db.execute('SELECT * FROM {};'.format(table)).fetchall()
+        tables[table] = sorted(tuple(round(v, 6) if isinstance(v, float) else v for v in row) for row in rows)
+    return tables
+
+
+def random_match(rng, players, games, dates):
+    '''Returns a match dict between two random players on one of dates'''
+    p1, p2 = rng.sample(players, 2)
+    return {'game': rng.choice(games), 'p1': p1, 'p2': p2, 'win': rng.choice([p1, p2]), 'date': rng.choice(dates)}
+
+
+def check(data, seed=1):
+    '''Records, edits and deletes back-dated matches through Data, then compares every summary table with a rebuild
+
+    Returns a list of table names whose incremental contents differ, empty when consistent'''
+    rng = random.Random(seed)
+    players = data.query.all_player_names(True)
+    games = data.query.all_game_names(True)
+    c = data.db.cursor()
+    c.execute('SELECT MIN(Date), MAX(Date) FROM MatchRecords;')
+    first, last = c.fetchone()
+    dates = [first, last, '2000-01-01'] # Oldest, newest and before every existing match
+    c.execute('SELECT DISTINCT Date FROM MatchRecords ORDER BY RANDOM() LIMIT 20;')
+    dates += [row[0] for row in c.fetchall()]
+
+    for _ in range(10):
+        data.record_match(random_match(rng, players, games, dates))
+    data.record_matches([random_match(rng, players, games, dates) for _ in range(50)])
+
+    c.execute('SELECT Id FROM MatchRecords ORDER BY RANDOM() LIMIT 10;')
+    ids = [row[0] for row in c.fetchall()]
+    for recordId in ids[:5]:
+        data.edit_match(recordId, random_match(rng, players, games, dates))
+    for recordId in ids[5:]:
+        data.delete_match(recordId)
+
+    data.refresh_glicko()
+    incremental = snapshot(data)
+    data.rebuild_stats()
+    data.rebuild_ratings()
+    rebuilt = snapshot(data)
+
+    return [table for table in TABLES if incremental[table] != rebuilt[table]]
+
+
+def main():
+    matches = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    source = league.cached(matches, os.path.join(tempfile.gettempdir(), 'grudgematch-leagues'))
+    workDir = tempfile.mkdtemp()
+    path = os.path.join(workDir, 'records.db')
+    shutil.copyfile(source, path)
+
+    data = Data(path)
+    try:
+        differ = check(data, seed)
+    finally:
+        data.close()
+        shutil.rmtree(workDir, ignore_errors=True)
+
+    if differ:
+        print('Incremental tables differ from a rebuild: ' + ', '.join(differ))
+        return 1
+    print('Incremental tables match a rebuild ({} matches, seed {})'.format(matches, seed))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# import_time.py - Measures cold-start import time of the src package in fresh interpreters
+# Run from the repository root: python benchmarks/import_time.py [runs]
+
+import os, sys, subprocess, statistics, time
+
+
+# (description, statement) for each import path measured
+STATEMENTS = [
+    ('interpreter only', 'pass'),
+    ('from src import Data', 'from src import Data'),
+    ('import src.cli', 'import src.cli'),
+    ('from src import Window', 'from src import Window'),
+]
+
+
+def measure(statement, runs):
+    '''Returns (median seconds, tkinter loaded) for running statement in new interpreters'''
+    check = statement + '\nimport sys\nprint("tkinter" in sys.modules)'
+    times, loaded = [], False
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', check], cwd=os.getcwd(), capture_output=True, text=True, check=True)
+        times.append(time.perf_counter() - start)
+        loaded = result.stdout.strip() == 'True'
+
+    return statistics.median(times), loaded
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    base = None
+
+    for name, statement in STATEMENTS:
+        seconds, loaded = measure(statement, runs)
+        if base == None:
+            base = seconds
+        print('{:<24} {:7.1f} ms  (+{:5.1f} ms over interpreter)  tkinter loaded: {}'.format(
+            name, seconds * 1000, (seconds - base) * 1000, loaded))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# league.py - Builds deterministic synthetic records.db files for benchmarking
+# Run from the repository root: python benchmarks/league.py <matches> <path> [seed]
+
+import os, sys, math, random, sqlite3, datetime
+sys.path.insert(0, os.getcwd())
+
+
+GENERATOR_VERSION = 2 # Bump when the output changes, cached leagues are rebuilt
+GAMES = ['Street Fighter II', 'Tekken 3', 'Super Smash Bros', 'Mario Kart 64', 'GoldenEye 007', 'Soulcalibur',
+    'Mortal Kombat', 'Rocket League', 'FIFA 98', 'Virtua Fighter', 'Chess', 'Windjammers']
+START_DATE = datetime.date(2015, 1, 1)
+DAYS = 3650 # Matches are spread evenly over ten years
+CLUB_SIZE = 25 # Players mostly face others from their own club, which produces rivalries
+CLUB_LOYALTY = 0.7 # Chance an opponent is drawn from the player's club
+
+
+def league_size(matches):
+    '''Returns (players, games) scaled for a league of the given number of matches'''
+    return min(5000, max(20, int(math.sqrt(matches) * 2))), len(GAMES)
+
+
+def zipf_weights(count, exponent):
+    '''Returns cumulative weights where rank r is drawn in proportion to 1 / (r + 1) ** exponent'''
+    total, cumulative = 0.0, []
+    for rank in range(count):
+        total += 1 / (rank + 1) ** exponent
+        cumulative.append(total)
+    return cumulative
+
+
+def generate(matches, seed=1):
+    '''Yields (GameId, Player1Id, Player2Id, WinnerId, Date) for a skewed league, oldest first
+
+    A few players and games account for most matches, opponents are usually club mates, and
+    winners follow a hidden skill rating so streaks and ratings look like real play'''
+    rng = random.Random(seed)
+    playerCount, gameCount = league_size(matches)
+    skill = [rng.gauss(0, 1) for _ in range(playerCount)]
+
+    activity = zipf_weights(playerCount, 0.9)
+    popularity = zipf_weights(gameCount, 1.1)
+    players = list(range(playerCount))
+
+    clubs = []
+    for start in range(0, playerCount, CLUB_SIZE):
+        members = players[start:start + CLUB_SIZE]
+        clubs.append((members, zipf_weights(len(members), 0.5)))
+
+    dates = {}
+    for i in range(matches):
+        p1 = rng.choices(players, cum_weights=activity)[0]
+        p2 = p1
+        while p2 == p1:
+            if rng.random() < CLUB_LOYALTY:
+                members, weights = clubs[p1 // CLUB_SIZE]
+                p2 = rng.choices(members, cum_weights=weights)[0] if len(members) > 1 else rng.choices(players, cum_weights=activity)[0]
+            else:
+                p2 = rng.choices(players, cum_weights=activity)[0]
+
+        game = rng.choices(range(gameCount), cum_weights=popularity)[0]
+        winner = p1 if rng.random() < 1 / (1 + math.exp(skill[p2] - skill[p1])) else p2
+
+        day = i * DAYS // matches
+        if day not in dates:
+            dates[day] = (START_DATE + datetime.timedelta(days=day)).strftime('%Y-%m-%d')
+
+        yield game + 1, p1 + 1, p2 + 1, winner + 1, dates[day]
+
+
+def build(matches, path, seed=1, chunkSize=100000):
+    '''Writes a new league database to path with the base schema, then opens it with Data to apply migrations'''
+    from src.data import Data
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    playerCount, gameCount = league_size(matches)
+    conn = sqlite3.connect(path)
+    with open(os.path.join('src', 'sql', 'create_db_tables.sql')) as script:
+        conn.executescript(script.read())
+    conn.execute('PRAGMA synchronous = OFF;') # Throwaway file, durability does not matter while generating
+
+    rng = random.Random(seed)
+    conn.executemany('INSERT INTO Players (Name, IsActive) VALUES (?, ?)',
+        [('Player{:04d}'.format(i + 1), int(rng.random() > 0.1)) for i in range(playerCount)])
+    conn.executemany('INSERT INTO Games (Name, Developer, Platform, ReleaseYear) VALUES (?, ?, ?, ?)',
+        [(name, 'Dev {}'.format(i % 4), 'Platform {}'.format(i % 3), 1990 + i) for i, name in enumerate(GAMES[:gameCount])])
+
+    chunk = []
+    for row in generate(matches, seed):
+        chunk.append(row)
+        if len(chunk) >= chunkSize:
+            conn.executemany('INSERT INTO MatchRecords (GameId, Player1Id, Player2Id, WinnerId, Date) VALUES (?,?,?,?,?)', chunk)
+            chunk = []
+    if chunk:
+        conn.executemany('INSERT INTO MatchRecords (GameId, Player1Id, Player2Id, WinnerId, Date) VALUES (?,?,?,?,?)', chunk)
+
+    conn.commit()
+    conn.close()
+
+    data = Data(path) # Migrations build indexes, summary tables and ratings
+    data.close()
+    return path
+
+
+def cached(matches, directory, seed=1):
+    '''Returns the path of a league database in directory, building it on first use'''
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, 'league_v{}_s{}_{}.db'.format(GENERATOR_VERSION, seed, matches))
+    if not os.path.exists(path):
+        partial = path + '.partial'
+        build(matches, partial, seed) # Closing the last connection checkpoints and removes the WAL
+        os.replace(partial, path)
+    return path
+
+
+def main():
+    if len(sys.argv) < 3:
+        print('Usage: python benchmarks/league.py <matches> <path> [seed]')
+        return 2
+
+    matches, path = int(sys.argv[1]), sys.argv[2]
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    build(matches, path, seed)
+    print('{} matches written to {}'.format(matches, path))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
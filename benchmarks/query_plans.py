@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# query_plans.py - Compares EXPLAIN QUERY PLAN output for hot MatchRecords queries before and after migrations
+# Run from the repository root: python benchmarks/query_plans.py
+
+import os, sys, sqlite3, tempfile
+sys.path.insert(0, os.getcwd())
+from src.data import Data
+
+
+# (description, sql, args) for each query that must be served by an index
+HOT_QUERIES = [
+    ('wins by player',
+        'SELECT COUNT(*) FROM MatchRecords WHERE WinnerId = ?', (1,)),
+    ('matches by player',
+        'SELECT COUNT(*), MAX(Date) FROM MatchRecords WHERE Player1Id = ? OR Player2Id = ?', (1, 1)),
+    ('matches by game',
+        'SELECT COUNT(*), MAX(Date) FROM MatchRecords WHERE GameId = ?', (1,)),
+    ('game records by date',
+        'SELECT Id FROM MatchRecords WHERE GameId = ? ORDER BY Date', (1,)),
+    ('head-to-head',
+        'SELECT Id FROM MatchRecords WHERE Player1Id = ? AND Player2Id = ?', (1, 2)),
+    ('date range',
+        'SELECT Id FROM MatchRecords WHERE Date BETWEEN ? AND ?', ('2020-01-01', '2020-12-31')),
+]
+
+
+def query_plan(cursor, sql, args):
+    '''Returns the plan details for a single statement as a list of strings'''
+    cursor.execute('EXPLAIN QUERY PLAN ' + sql, args)
+    return [row[3] for row in cursor.fetchall()]
+
+
+def uses_scan(plan):
+    '''Returns True if any step of the plan is a full scan of MatchRecords'''
+    for step in plan:
+        if step.startswith('SCAN') and 'Records' in step and 'INDEX' not in step:
+            return True
+    return False
+
+
+def filtered_records(query, **filters):
+    '''Returns (sql, args) for Query.match_records with the given filters'''
+    where, args = query.record_filter(**filters)
+    return 'SELECT Records.Id FROM MatchRecords AS Records {}'.format(where), args
+
+
+def main():
+    tempDir = tempfile.mkdtemp()
+
+    # Before: base schema only, as created by older versions
+    before = sqlite3.connect(os.path.join(tempDir, 'before.db'))
+    with open(os.path.join('src', 'sql', 'create_db_tables.sql')) as script:
+        before.executescript(script.read())
+
+    # After: fully migrated schema
+    after = Data(os.path.join(tempDir, 'after.db'))
+
+    hotQueries = HOT_QUERIES + [
+        ('match_records by player', *filtered_records(after.query, p1=1)),
+        ('match_records by players and game', *filtered_records(after.query, p1=1, p2=2, game=1)),
+        ('match_records by winner', *filtered_records(after.query, winner=1)),
+        ('match_records by date range', *filtered_records(after.query, start='2020-01-01', end='2020-12-31')),
+    ]
+
+    failed = 0
+    for name, sql, args in hotQueries:
+        old = query_plan(before.cursor(), sql, args)
+        new = query_plan(after.c, sql, args)
+        status = 'FULL SCAN' if uses_scan(new) else 'ok'
+        failed += uses_scan(new)
+
+        print('{} [{}]'.format(name, status))
+        print('  before: ' + '; '.join(old))
+        print('  after:  ' + '; '.join(new))
+
+    print('Schema version: {}'.format(after.schema_version()))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# suite.py - Times Query methods, match recording and UI tree builders against synthetic leagues
+# Run from the repository root: python benchmarks/suite.py [--sizes 1k,100k,10m] [--repeat N] [--json PATH]
+# Tree builders need a display, use xvfb-run on headless machines; they are skipped when Tk cannot start.
+# Each size ends with the consistency check, which fails the run if incremental stats differ from a rebuild.
+
+import os, sys, json, time, shutil, inspect, argparse, platform, sqlite3, statistics, subprocess, tempfile
+sys.path.insert(0, os.getcwd())
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import league, consistency
+from src.data import Data, Query
+
+
+SIZES = {'1k': 1000, '100k': 100000, '10m': 10000000}
+
+
+def measure(func, repeat):
+    '''Calls func repeat times, returns timing summary in milliseconds and the row count of the last result'''
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - start) * 1000)
+
+    timing = {'median_ms': round(statistics.median(times), 3), 'min_ms': round(min(times), 3),
+        'max_ms': round(max(times), 3), 'runs': repeat}
+    if isinstance(result, (list, tuple, dict)):
+        timing['rows'] = len(result)
+    return timing
+
+
+def samples(data):
+    '''Returns ids and names of busy entries to use as query arguments'''
+    c = data.reader.cursor()
+    c.execute('SELECT Player1Id, COUNT(*) FROM MatchRecords GROUP BY Player1Id ORDER BY 2 DESC LIMIT 1;')
+    player = c.fetchone()[0]
+    c.execute('SELECT GameId FROM GameStats ORDER BY Matches DESC LIMIT 1;')
+    game = c.fetchone()[0]
+    c.execute('SELECT PlayerLow, PlayerHigh FROM HeadToHead ORDER BY LowWins + HighWins DESC LIMIT 1;')
+    low, high = c.fetchone()
+    c.execute('SELECT Date, Id FROM MatchRecords WHERE GameId = ? ORDER BY Date, Id LIMIT 1 OFFSET 1000;', (game,))
+    after = c.fetchone()
+    c.execute('SELECT MAX(Id) FROM MatchRecords;')
+    last = c.fetchone()[0]
+    c.execute('SELECT Name FROM Players WHERE Id = ?', (player,))
+    playerName = c.fetchone()[0]
+    c.execute('SELECT Name FROM Games WHERE Id = ?', (game,))
+    gameName = c.fetchone()[0]
+
+    return {'player': player, 'game': game, 'low': low, 'high': high, 'after': tuple(after) if after else None,
+        'last': last, 'playerName': playerName, 'gameName': gameName}
+
+
+def query_benchmarks(q, s):
+    '''Returns a dict of Query method name -> function making one representative call'''
+    def first_rows(table):
+        cursor = q.export_cursor(table)
+        rows = cursor.fetchmany(10000)
+        cursor.close()
+        return rows
+
+    return {
+        'all_player_names': lambda: q.all_player_names(True),
+        'all_game_names': lambda: q.all_game_names(True),
+        'all_player_ids': q.all_player_ids,
+        'all_game_ids': q.all_game_ids,
+        'all_player_status': q.all_player_status,
+        'all_game_status': q.all_game_status,
+        'all_player_details': lambda: q.all_player_details(True),
+        'all_player_form': lambda: q.all_player_form(True),
+        'player_streaks': lambda: q.player_streaks(s['player']),
+        'all_game_details': lambda: q.all_game_details(True),
+        'game_info': lambda: q.game_info(s['gameName']),
+        'match_folders': q.match_folders,
+        'recent_records': lambda: q.recent_records(20, p1=s['player']),
+        'player_id': lambda: q.player_id(s['playerName']),
+        'game_id': lambda: q.game_id(s['gameName']),
+        'player_entry': lambda: q.player_entry(s['playerName']),
+        'game_entry': lambda: q.game_entry(s['gameName']),
+        'data_version': q.data_version,
+        'last_record_id': q.last_record_id,
+        'records_after': lambda: q.records_after(s['last'] - 500),
+        'match_records_page': lambda: q.match_records_page(s['game'], s['after']),
+        'record_filter': lambda: q.record_filter(s['low'], s['high'], s['game']),
+        'match_records': lambda: q.match_records(s['low'], s['high']),
+        'head_to_head': lambda: q.head_to_head(s['low'], s['high']),
+        'rivalries': lambda: q.rivalries(s['game']),
+        'game_standings': lambda: q.game_standings(s['game']),
+        'glicko_standings': lambda: q.glicko_standings(s['game']),
+        'glicko_stale': lambda: q.glicko_stale(s['game']),
+        'head_to_head_matrix': lambda: q.head_to_head_matrix(s['game']),
+        'export_cursor': lambda: first_rows('records'),
+    }
+
+
+def data_benchmarks(data, s, repeat):
+    '''Times match conversion, name validation and recording, which writes to the database'''
+    players = data.query.all_player_names(True)
+    match = {'game': s['gameName'], 'p1': players[0], 'p2': players[1], 'win': players[0], 'date': '2030-01-01'}
+
+    return {
+        'convert_match': measure(lambda: data.convert_match(match), repeat),
+        'validate_player_name': measure(lambda: data.validate_player_name('Newcomer'), repeat),
+        'validate_game_name': measure(lambda: data.validate_game_name('New Game'), repeat),
+        'record_match': measure(lambda: data.record_match(match), repeat),
+    }
+
+
+def wait_for(root, loader):
+    '''Runs the Tk event loop until a Loader has delivered every pending result'''
+    while loader.pending:
+        root.update()
+        time.sleep(0.0005)
+
+
+def ui_root():
+    '''Returns a hidden Tk root shared by every size, or None if Tk cannot start
+
+    One root is used for the whole run, images cached under a destroyed root cannot be shown in a new one'''
+    import tkinter as tk
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return None
+    root.withdraw()
+    return root
+
+
+def ui_benchmarks(data, root, repeat):
+    '''Times tree builders and the player grid under the shared hidden Tk root'''
+    import tkinter as tk
+    from src.edit import ManagePlayers, ManageGames
+    from src.match import MatchRecords
+    from src.home import PlayerIcons
+    from src.worker import Loader
+
+    results = {}
+    players = ManagePlayers()
+    players.loader = Loader(root, data.executor)
+    def build_players():
+        tree = players.build_tree(root, data)
+        wait_for(root, players.loader)
+        tree.destroy()
+    results['ManagePlayers.build_tree'] = measure(build_players, repeat)
+
+    games = ManageGames()
+    results['ManageGames.build_tree'] = measure(lambda: games.build_tree(root, data).destroy(), repeat)
+
+    records = MatchRecords()
+    records.data = data
+    records.loader = Loader(root, data.executor)
+    def build_records():
+        records.pages = {}
+        records.tree = records.build_tree(root, data)
+        wait_for(root, records.loader)
+        folder = next(iter(records.pages)) if records.pages else None
+        if folder != None: # First page of the busiest folder, as when it is expanded
+            records.load_page(folder)
+            wait_for(root, records.loader)
+        records.tree.destroy()
+    results['MatchRecords.build_tree'] = measure(build_records, repeat)
+
+    canvas = tk.Canvas(root, width=1000, height=700)
+    icons = PlayerIcons(canvas, data)
+    def layout():
+        icons.columns = 0 # Force a full pass
+        icons.position()
+        root.update_idletasks()
+    results['PlayerIcons.layout'] = measure(layout, repeat)
+
+    canvas.destroy()
+    return results
+
+
+def run_size(label, matches, args, root):
+    '''Runs every benchmark against a copy of the cached league for one size, then checks its summary tables'''
+    print('{}: preparing league of {} matches'.format(label, matches), flush=True)
+    source = league.cached(matches, args.cache)
+    workDir = tempfile.mkdtemp()
+    path = os.path.join(workDir, 'records.db')
+    shutil.copyfile(source, path) # record_match writes, keep the cached league pristine
+
+    data = Data(path)
+    s = samples(data)
+    results = {'matches': matches, 'query': {}, 'data': {}, 'ui': None, 'inconsistent': None}
+
+    benchmarks = query_benchmarks(data.query, s)
+    for name, func in benchmarks.items():
+        results['query'][name] = measure(func, args.repeat)
+        print('  Query.{:<22} {:10.3f} ms'.format(name, results['query'][name]['median_ms']), flush=True)
+
+    public = [n for n, m in inspect.getmembers(Query, inspect.isfunction) if not n.startswith('_')]
+    missing = sorted(set(public) - set(benchmarks))
+    if missing:
+        print('  Not benchmarked: ' + ', '.join(missing))
+
+    results['data'] = data_benchmarks(data, s, args.repeat)
+    for name, timing in results['data'].items():
+        print('  Data.{:<23} {:10.3f} ms'.format(name, timing['median_ms']), flush=True)
+
+    if root != None:
+        results['ui'] = ui_benchmarks(data, root, args.repeat)
+        for name, timing in results['ui'].items():
+            print('  {:<28} {:10.3f} ms'.format(name, timing['median_ms']), flush=True)
+    elif not args.no_ui:
+        print('  UI skipped, Tk could not start (no display?)')
+
+    results['inconsistent'] = consistency.check(data) # Last, it edits and rebuilds the league
+    if results['inconsistent']:
+        print('  Incremental tables differ from a rebuild: ' + ', '.join(results['inconsistent']), flush=True)
+    else:
+        print('  Incremental tables match a rebuild', flush=True)
+
+    data.close()
+    shutil.rmtree(workDir, ignore_errors=True)
+    return results
+
+
+def git_commit():
+    '''Returns the current commit hash, or None outside a git checkout'''
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GrudgeMatch benchmark suite')
+    parser.add_argument('--sizes', default='1k,100k', help='comma separated league sizes from: ' + ', '.join(SIZES))
+    parser.add_argument('--repeat', type=int, default=5, help='runs per benchmark, the median is reported')
+    parser.add_argument('--cache', default=os.path.join(tempfile.gettempdir(), 'grudgematch-leagues'), help='directory for generated leagues')
+    parser.add_argument('--json', help='result file, defaults to benchmarks/results/<commit>.json')
+    parser.add_argument('--no-ui', action='store_true', help='skip Tk tree builder benchmarks')
+    args = parser.parse_args()
+
+    labels = [l.strip().lower() for l in args.sizes.split(',') if l.strip()]
+    for label in labels:
+        if label not in SIZES:
+            parser.error('unknown size: {}'.format(label))
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'sizes': {},
+    }
+    root = ui_root() if not args.no_ui else None
+    for label in labels:
+        report['sizes'][label] = run_size(label, SIZES[label], args, root)
+    if root != None:
+        root.destroy()
+
+    path = args.json
+    if not path:
+        os.makedirs(os.path.join('benchmarks', 'results'), exist_ok=True)
+        path = os.path.join('benchmarks', 'results', '{}.json'.format(commit[:10] if commit else 'local'))
+    with open(path, 'w', encoding='utf-8') as outFile:
+        json.dump(report, outFile, indent=2)
+
+    print('Results written to {}'.format(path))
+    return 1 if any(size['inconsistent'] for size in report['sizes'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
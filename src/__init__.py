@@ -1,2 +1,18 @@
-from src.home import Window
-from src.data import Data
+import importlib
+
+# Modules are imported on first attribute access, so data-only consumers
+# (the CLI, scripts, benchmarks) never load tkinter
+__all__ = ['Window', 'Data']
+_modules = {'Window': 'src.home', 'Data': 'src.data'}
+
+
+def __getattr__(name):
+    if name in _modules:
+        value = getattr(importlib.import_module(_modules[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module 'src' has no attribute '{}'".format(name))
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + __all__)
@@ -0,0 +1,97 @@
+import tkinter as tk
+import os
+from collections import OrderedDict
+
+
+class AvatarCache:
+    avatarDir = os.path.join('img', 'avatars')
+
+    def __init__(self, maxBytes=32*1024*1024):
+        '''Decoded player avatars shared by all windows, least recently used images are dropped past maxBytes
+
+        Images are decoded once and reused until the file's mtime changes. Widgets showing an image must keep
+        their own reference to it, since dropping the last reference deletes the Tk image.
+        Images belong to the Tk root they were made under, the cache empties itself when that root is replaced'''
+        self.maxBytes = maxBytes
+        self.root = None # Default Tk root the cached images were created in
+        self.images = OrderedDict() # key=name, value=(mtime, PhotoImage, bytes)
+        self.bytes = 0
+        self.defaultImage = None
+        self.hits, self.misses = 0, 0
+
+
+    def check_root(self):
+        '''Empties the cache if the default Tk root was destroyed or replaced since images were cached'''
+        if tk._default_root is not self.root:
+            self.reset()
+            self.root = tk._default_root
+
+
+    def reset(self):
+        '''Forgets every cached image, including the default'''
+        self.images.clear()
+        self.bytes = 0
+        self.defaultImage = None
+
+
+    def default(self):
+        '''Returns the default avatar, decoded on first use and never evicted'''
+        self.check_root()
+        if self.defaultImage == None:
+            self.defaultImage = tk.PhotoImage(file=os.path.join(self.avatarDir, 'default.png'))
+        return self.defaultImage
+
+
+    def get(self, name, size=None):
+        '''Returns the avatar for a player, or the default if it is missing or not size (width, height)'''
+        self.check_root()
+        path = os.path.join(self.avatarDir, name + '.png')
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self.drop(name)
+            return self.default()
+
+        entry = self.images.get(name)
+        if entry != None and entry[0] == mtime:
+            self.hits += 1
+            self.images.move_to_end(name)
+            image = entry[1]
+        else:
+            self.misses += 1
+            self.drop(name)
+            try:
+                image = tk.PhotoImage(file=path)
+            except tk.TclError: # Unreadable image
+                return self.default()
+            self.store(name, mtime, image)
+
+        if size != None and (image.width(), image.height()) != size:
+            return self.default()
+        return image
+
+
+    def store(self, name, mtime, image):
+        '''Adds a decoded image, evicting the least recently used past maxBytes'''
+        size = image.width() * image.height() * 4
+        self.images[name] = (mtime, image, size)
+        self.bytes += size
+
+        while self.bytes > self.maxBytes and len(self.images) > 1:
+            self.bytes -= self.images.popitem(last=False)[1][2]
+
+
+    def drop(self, name):
+        '''Forgets a cached image'''
+        entry = self.images.pop(name, None)
+        if entry != None:
+            self.bytes -= entry[2]
+
+
+    def stats(self):
+        '''Returns a dict of cache counters'''
+        return {'images': len(self.images), 'bytes': self.bytes, 'hits': self.hits, 'misses': self.misses}
+
+
+
+avatars = AvatarCache() # Shared by the main window and match windows
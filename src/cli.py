@@ -0,0 +1,239 @@
+# cli.py - GrudgeMatch command-line interface, for recording and querying matches without the Tk UI
+# Run from the GrudgeMatch directory: python -m src.cli --help
+
+import argparse, csv, datetime, sys
+from src.data import Data
+from src.transfer import MatchImporter, MatchExporter, create_missing
+
+
+def print_table(headings, rows):
+    '''Prints rows as left-aligned columns under headings'''
+    rows = [['' if v == None else str(v) for v in row] for row in rows]
+    widths = [len(h) for h in headings]
+    for row in rows:
+        widths = [max(w, len(v)) for w, v in zip(widths, row)]
+
+    line = '  '.join('{:<' + str(w) + '}' for w in widths)
+    print(line.format(*headings).rstrip())
+    for row in rows:
+        print(line.format(*row).rstrip())
+
+
+def lookup(data, table, name):
+    '''Returns the id for a player or game name, exits with an error if missing'''
+    try:
+        if table == 'player':
+            return data.identities.player_id(name)
+        return data.identities.game_id(name)
+    except KeyError:
+        sys.exit('Unknown {}: {}'.format(table, name))
+
+
+def cmd_record(data, args):
+    '''Records one match from arguments, or many from stdin lines of game,p1,p2,winner[,date]'''
+    today = datetime.date.today().strftime("%Y-%m-%d")
+
+    if args.game:
+        if not (args.p1 and args.p2 and args.winner):
+            sys.exit('record needs GAME P1 P2 WINNER, or no arguments to read from stdin')
+        matches = [{'game': args.game, 'p1': args.p1, 'p2': args.p2, 'win': args.winner, 'date': args.date or today}]
+        lines, rejected = [1], []
+    else:
+        matches, lines, rejected = [], [], [] # lines holds the stdin line number of each match
+        for number, row in enumerate(csv.reader(sys.stdin), 1):
+            if not row or not ''.join(row).strip():
+                continue
+            row = [v.strip() for v in row]
+            if len(row) < 4 or '' in row[:4]: # Short lines are rejected, not padded into entries with empty names
+                rejected.append((number, ','.join(row), 'Expected game,p1,p2,winner[,date]'))
+                continue
+            row += ['']
+            matches.append({'game': row[0], 'p1': row[1], 'p2': row[2], 'win': row[3], 'date': row[4] or args.date or today})
+            lines.append(number)
+
+    if args.create:
+        for entry in create_missing(data, matches):
+            print('Added {}: {}'.format(*entry))
+
+    failed = data.record_matches(matches)
+    for index, match, message in failed:
+        rejected.append((lines[index], ','.join([match.get(k, '') for k in ('game', 'p1', 'p2', 'win')]), message))
+    for number, row, message in sorted(rejected):
+        print('Rejected {} ({}): {}'.format(number, row, message), file=sys.stderr)
+
+    print('{} matches recorded'.format(len(matches) - len(failed)))
+    return 1 if rejected else 0
+
+
+def cmd_import(data, args):
+    '''Streams a CSV/JSONL file into the records table'''
+    importer = MatchImporter(data, args.file, args.format, args.batch_size)
+    try:
+        importer.run(lambda i: print('\r{:.0%} {}'.format(i.progress(), i.summary()), end='', file=sys.stderr))
+    except ValueError as e:
+        print(file=sys.stderr)
+        print('Import stopped at row {}: {}'.format(importer.current_row(), e), file=sys.stderr)
+        print(importer.summary())
+        return 1
+    print(file=sys.stderr)
+
+    for number, row, message in importer.errors:
+        print('Row {}: {}'.format(number, message), file=sys.stderr)
+
+    print(importer.summary())
+    return 1 if importer.failures else 0
+
+
+def cmd_export(data, args):
+    '''Streams a table to a CSV, JSONL or columnar file'''
+    exporter = MatchExporter(data, args.table, args.file, args.format)
+    try:
+        exporter.run()
+    except OSError as e:
+        print('Export failed: {}'.format(e), file=sys.stderr)
+        return 1
+    print(exporter.summary())
+    return 0
+
+
+def cmd_standings(data, args):
+    '''Prints overall standings, or Elo or Glicko-2 standings for one game'''
+    if args.game and args.glicko:
+        data.refresh_glicko()
+        rows = data.query.glicko_standings(lookup(data, 'game', args.game))
+        print_table(['#', 'Player', 'Rating', 'RD', 'Volatility'],
+            [[i + 1, r[0], round(r[1]), round(r[2]), round(r[3], 4)] for i, r in enumerate(rows)])
+    elif args.game:
+        rows = data.query.game_standings(lookup(data, 'game', args.game))
+        print_table(['#', 'Player', 'Elo', 'Wins', 'Matches'],
+            [[i + 1, r[0], round(r[1]), r[2], r[3]] for i, r in enumerate(rows)])
+    else:
+        rows = sorted(data.query.all_player_details(True), key=lambda p: (-p[2], p[3], p[1]))
+        print_table(['#', 'Player', 'Wins', 'Matches', 'Last', 'Best Elo', 'Form'],
+            [[i + 1, p[1], p[2], p[3], p[4], '' if p[5] == None else round(p[5]), p[7]] for i, p in enumerate(rows)])
+    return 0
+
+
+def cmd_h2h(data, args):
+    '''Prints head-to-head records between two players for each game'''
+    p1 = lookup(data, 'player', args.p1)
+    p2 = lookup(data, 'player', args.p2)
+    print_table(['Game', args.p1, args.p2, 'Last'], data.query.head_to_head(p1, p2))
+    return 0
+
+
+def cmd_records(data, args):
+    '''Prints match records matching the filters'''
+    filters = {'start': args.since, 'end': args.until}
+    if args.player:
+        filters['p1'] = lookup(data, 'player', args.player)
+    if args.opponent:
+        filters['p2'] = lookup(data, 'player', args.opponent)
+    if args.game:
+        filters['game'] = lookup(data, 'game', args.game)
+
+    if args.limit:
+        rows = data.query.recent_records(args.limit, **filters)
+    else:
+        rows = data.query.match_records(**filters)
+    print_table(['Id', 'Date', 'P1', 'P2', 'Winner', 'Game'], rows)
+    return 0
+
+
+def cmd_rebuild(data, args):
+    '''Recalculates all summary tables and ratings from match records'''
+    data.rebuild_stats()
+    data.rebuild_ratings()
+    print('Stats and ratings rebuilt')
+    return 0
+
+
+def cmd_serve(data, args):
+    '''Runs the HTTP/JSON API until interrupted'''
+    from src.server import ApiServer
+    data.refresh_glicko() # The read-only pool cannot replay ratings
+    data.close() # Server only reads through its own pool
+    server = ApiServer(data.path, args.host, args.port)
+    print('Serving on http://{}:{}/ (players, games, records, h2h, standings, glicko, events)'.format(args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def build_parser():
+    '''Returns the argument parser for all sub-commands'''
+    parser = argparse.ArgumentParser(prog='python -m src.cli', description='GrudgeMatch command-line interface')
+    parser.add_argument('--db', help='path to records database (default data/records.db)')
+    parser.add_argument('--profile', action='store_true', help='print query timings to stderr when done')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('record', help='record a match, or read game,p1,p2,winner[,date] lines from stdin')
+    p.add_argument('game', nargs='?')
+    p.add_argument('p1', nargs='?')
+    p.add_argument('p2', nargs='?')
+    p.add_argument('winner', nargs='?')
+    p.add_argument('--date', help='YYYY-MM-DD, defaults to today')
+    p.add_argument('--create', action='store_true', help='add missing players and games')
+    p.set_defaults(func=cmd_record)
+
+    p = sub.add_parser('import', help='import matches from a CSV or JSONL file')
+    p.add_argument('file')
+    p.add_argument('--format', choices=['csv', 'jsonl'])
+    p.add_argument('--batch-size', type=int, default=5000)
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser('export', help='export records, players or games')
+    p.add_argument('table', choices=['records', 'players', 'games'])
+    p.add_argument('file')
+    p.add_argument('--format', choices=['csv', 'jsonl', 'columnar'])
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser('standings', help='list standings, overall or for one game')
+    p.add_argument('--game')
+    p.add_argument('--glicko', action='store_true', help='show Glicko-2 ratings instead of Elo, needs --game')
+    p.set_defaults(func=cmd_standings)
+
+    p = sub.add_parser('h2h', help='head-to-head record between two players')
+    p.add_argument('p1')
+    p.add_argument('p2')
+    p.set_defaults(func=cmd_h2h)
+
+    p = sub.add_parser('records', help='list match records')
+    p.add_argument('--player')
+    p.add_argument('--opponent')
+    p.add_argument('--game')
+    p.add_argument('--since', help='first date, YYYY-MM-DD')
+    p.add_argument('--until', help='last date, YYYY-MM-DD')
+    p.add_argument('--limit', type=int, help='only show the most recent N, newest first')
+    p.set_defaults(func=cmd_records)
+
+    p = sub.add_parser('serve', help='serve standings and results as JSON for overlays')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8765)
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser('rebuild', help='recalculate stats and ratings from records')
+    p.set_defaults(func=cmd_rebuild)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    data = Data(args.db)
+    if args.profile and data.profiler == None:
+        data.enable_profiling()
+
+    try:
+        return args.func(data, args)
+    finally:
+        if data.profiler != None and args.profile:
+            print(data.profiler.summary(), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,21 @@
-import os, json, sys, sqlite3
+import os, json, sys, sqlite3, datetime
+from src.rating import Elo, Glicko2
+from src.streaks import Streaks
+from src.events import EventBus
+from src.worker import QueryExecutor
+from src.profiler import QueryProfiler, ProfiledCursor
 
 
 class Config:
+    # SQLite tuning applied to every connection, override per key under "database" in config.json
+    pragmaDefaults = {
+        "journal_mode": "wal", # Readers no longer block on the writer
+        "synchronous": "normal", # Safe with WAL, fsyncs at checkpoints rather than every commit
+        "cache_size": -16000, # Negative is KiB, so 16 MB of page cache per connection
+        "mmap_size": 268435456, # 256 MB memory-mapped reads
+        "temp_store": "memory",
+    }
+
     def __init__(self):
         '''Holds configuration options'''
         self.path = os.path.join('data', 'config.json')
@@ -12,7 +26,13 @@ class Config:
         '''Creates the default config file is config is missing or damaged'''
         default = {"settings":{
             "hide_sidebar": False,
-        }}
+            "api_port": 0,
+            "profile_queries": False,
+            "slow_query_ms": 100,
+            "ui_metrics": False,
+        },
+        "database": dict(self.pragmaDefaults),
+        }
 
         with open(os.path.join(self.path), 'w', encoding='utf-8') as cFile:
             json.dump(default, cFile, ensure_ascii=False, indent=2)
@@ -31,21 +51,29 @@ class Config:
             c = self.create_default()
 
         self.settings = c['settings']
+        self.database = c.get('database', {})
+
+
+    def pragmas(self):
+        '''Returns the database pragma profile, defaults overridden by config values'''
+        profile = dict(self.pragmaDefaults)
+        profile.update(self.database)
+        return profile
 
 
     def save(self):
         '''Saves config data to data/config.json'''
-        data = {'settings':self.settings}
+        data = {'settings':self.settings, 'database':self.database}
         with open(self.path, 'w', encoding='utf-8') as cFile:
             json.dump(data, cFile, ensure_ascii=False, indent=2)
 
 
 
 class Query:
-    def __init__(self,conn,cursor):
-        '''Contains methods to query database'''
+    def __init__(self,conn,cursor,profiler=None):
+        '''Contains methods to query database, statements are timed when a QueryProfiler is given'''
         self.db = conn
-        self.c = cursor
+        self.c = cursor if profiler == None else ProfiledCursor(cursor, profiler)
 
 
     def all_player_names(self, isActive):
@@ -129,48 +157,67 @@ class Query:
 
 
     def all_player_details(self, isActive):
-        '''Returns a list of tuples (Id, Name, Wins, Matches, LastMatch) for each player'''
-        if isActive:
-            active = ('1',)
-        else:
-            active = ('%',)
-
+        '''Returns a list of tuples (Id, Name, Wins, Matches, LastMatch, BestRating, Streak, Form) for each player'''
         self.c.execute('''
             SELECT
                 Players.Id AS Id,
                 Players.Name AS Name,
-                (SELECT COUNT(*) FROM MatchRecords WHERE WinnerId = Players.Id) as WinCount,
-                (SELECT COUNT(*) FROM MatchRecords WHERE Player1Id = Players.Id OR Player2Id = Players.Id) as MatchCount,
-                (SELECT MAX(Date) FROM MatchRecords WHERE Player1Id = Players.Id OR Player2Id = Players.Id) as LastMatch
+                IFNULL(Stats.Wins, 0) AS WinCount,
+                IFNULL(Stats.Matches, 0) AS MatchCount,
+                Stats.LastMatch AS LastMatch,
+                (SELECT MAX(Rating) FROM Ratings WHERE Ratings.PlayerId = Players.Id) AS BestRating,
+                IFNULL(Streaks.Current, 0) AS Streak,
+                IFNULL(Streaks.Form, '') AS Form
 
             FROM Players
+            LEFT JOIN PlayerStats AS Stats ON Stats.PlayerId = Players.Id
+            LEFT JOIN Streaks ON Streaks.PlayerId = Players.Id AND Streaks.GameId = 0
+
+            WHERE Players.IsActive = 1 OR ? = 0;''', (int(isActive),))
+
+        return self.c.fetchall()
+
+
+    def all_player_form(self, isActive):
+        '''Returns a dict where key=name, value=(Streak, Longest, Form) for each player with overall streaks'''
+        self.c.execute('''
+            SELECT Players.Name, Streaks.Current, Streaks.Longest, Streaks.Form
+            FROM Players
+            JOIN Streaks ON Streaks.PlayerId = Players.Id AND Streaks.GameId = 0
+            WHERE Players.IsActive = 1 OR ? = 0;''', (int(isActive),))
 
-            WHERE Players.IsActive = ?
+        form = {}
+        for r in self.c.fetchall():
+            form[r[0]] = r[1:]
 
-            GROUP BY Players.Id;''', active)
+        return form
+
+
+    def player_streaks(self, player):
+        '''Accepts a player id, returns a list of tuples (Game, Streak, Longest, Form), overall first with Game None'''
+        self.c.execute('''
+            SELECT Games.Name, Streaks.Current, Streaks.Longest, Streaks.Form
+            FROM Streaks
+            LEFT JOIN Games ON Games.Id = Streaks.GameId
+            WHERE Streaks.PlayerId = ?
+            ORDER BY Streaks.GameId;''', (int(player),))
 
         return self.c.fetchall()
 
 
     def all_game_details(self, isActive):
         '''Returns a list of tuples (name,nMatches,lastMatch) for each game'''
-        if isActive:
-            active = ('1',)
-        else:
-            active = ('%',)
-
         self.c.execute('''
             SELECT
                 Games.Id AS Id,
                 Games.Name AS Name,
-                (SELECT COUNT(*) FROM MatchRecords WHERE GameId = Games.Id) as MatchCount,
-                (SELECT MAX(Date) FROM MatchRecords WHERE GameId = Games.Id) as LastMatch
+                IFNULL(Stats.Matches, 0) AS MatchCount,
+                Stats.LastMatch AS LastMatch
 
             FROM Games
+            LEFT JOIN GameStats AS Stats ON Stats.GameId = Games.Id
 
-            WHERE Games.IsActive = ?
-
-            GROUP BY Games.Id;''', active)
+            WHERE Games.IsActive = 1 OR ? = 0;''', (int(isActive),))
 
         return self.c.fetchall()
 
@@ -188,55 +235,463 @@ class Query:
 
 
     def match_folders(self):
-        '''Returns a sorted list of all games found in match records (id, name)'''
+        '''Returns a sorted list of all games found in match records (id, name, matches)'''
         self.c.execute('''
-            SELECT DISTINCT Records.GameId as GameId,
-                (SELECT Games.Name FROM Games WHERE Games.Id = Records.GameId) AS GameName
-            FROM MatchRecords AS Records, Games
-            WHERE Games.IsActive = 1
+            SELECT Games.Id AS GameId, Games.Name AS GameName, Stats.Matches AS MatchCount
+            FROM GameStats AS Stats
+            JOIN Games ON Games.Id = Stats.GameId
+            WHERE Stats.Matches > 0
             ORDER BY Games.Name;''')
 
         return self.c.fetchall()
 
 
-    def match_records(self, p1, p2, game):
-        '''Accepts ids for p1, p2, and game, returns all matching results from records table, pass '%' for wildcard'''
-        args = (p1,p1,p2,p2,game)
+    def recent_records(self, limit=20, p1=None, p2=None, game=None, winner=None, start=None, end=None):
+        '''Returns up to limit of the newest (RecordId, Date, Player1, Player2, Winner, Game) matching the filters, newest first'''
+        where, args = self.record_filter(p1, p2, game, winner, start, end)
+        self.c.execute('''
+            SELECT
+                Records.Id AS RecordId,
+                Records.Date AS Date,
+                Player1.Name AS Player1,
+                Player2.Name AS Player2,
+                Winner.Name AS Winner,
+                Games.Name AS Game
+
+            FROM MatchRecords AS Records
+            JOIN Players AS Player1 ON Player1.Id = Records.Player1Id
+            JOIN Players AS Player2 ON Player2.Id = Records.Player2Id
+            JOIN Players AS Winner ON Winner.Id = Records.WinnerId
+            JOIN Games ON Games.Id = Records.GameId
+
+            {}
+
+            ORDER BY Records.Date DESC, Records.Id DESC
+            LIMIT ?;'''.format(where), args + (int(limit),))
+
+        return self.c.fetchall()
+
+
+    def player_id(self, name):
+        '''Returns the id for a player name, or None if missing'''
+        self.c.execute('SELECT Id FROM Players WHERE Name = ?;', (name,))
+        result = self.c.fetchone()
+        return None if result == None else result[0]
+
+
+    def game_id(self, name):
+        '''Returns the id for a game name, or None if missing'''
+        self.c.execute('SELECT Id FROM Games WHERE Name = ?;', (name,))
+        result = self.c.fetchone()
+        return None if result == None else result[0]
+
+
+    def player_entry(self, name):
+        '''Returns [id, isActive] for a player name, or None if missing'''
+        self.c.execute('SELECT Id, IsActive FROM Players WHERE Name = ?;', (name,))
+        result = self.c.fetchone()
+        return None if result == None else list(result)
+
+
+    def game_entry(self, name):
+        '''Returns [id, isActive] for a game name, or None if missing'''
+        self.c.execute('SELECT Id, IsActive FROM Games WHERE Name = ?;', (name,))
+        result = self.c.fetchone()
+        return None if result == None else list(result)
+
+
+    def data_version(self):
+        '''Returns a number that changes whenever another connection commits to the database'''
+        self.c.execute('PRAGMA data_version;')
+        return self.c.fetchone()[0]
+
+
+    def last_record_id(self):
+        '''Returns the highest record id, 0 if there are no records'''
+        self.c.execute('SELECT IFNULL(MAX(Id), 0) FROM MatchRecords;')
+        return self.c.fetchone()[0]
+
+
+    def records_after(self, recordId, limit=500):
+        '''Returns up to limit (RecordId, Date, Player1, Player2, Winner, Game) with ids above recordId, oldest first'''
         self.c.execute('''
             SELECT
                 Records.Id AS RecordId,
                 Records.Date AS Date,
-                (SELECT Players.Name FROM Players WHERE Players.Id = Records.Player1Id) AS Player1,
-                (SELECT Players.Name FROM Players WHERE Players.Id = Records.Player2Id) AS Player2,
-                (SELECT Players.Name FROM Players WHERE Players.Id = Records.WinnerId) AS Winner,
-                (SELECT Games.Name FROM Games WHERE Games.Id = Records.GameId) AS Game
+                Player1.Name AS Player1,
+                Player2.Name AS Player2,
+                Winner.Name AS Winner,
+                Games.Name AS Game
+
+            FROM MatchRecords AS Records
+            JOIN Players AS Player1 ON Player1.Id = Records.Player1Id
+            JOIN Players AS Player2 ON Player2.Id = Records.Player2Id
+            JOIN Players AS Winner ON Winner.Id = Records.WinnerId
+            JOIN Games ON Games.Id = Records.GameId
+
+            WHERE Records.Id > ?
+
+            ORDER BY Records.Id
+            LIMIT ?;''', (int(recordId), int(limit)))
+
+        return self.c.fetchall()
+
+
+    def match_records_page(self, game, after=None, limit=200):
+        '''Returns up to limit records (RecordId, Date, Player1, Player2, Winner) for one game id
+
+        Records are ordered by (Date, RecordId), pass the (Date, RecordId) of the last row seen as after to continue'''
+        if after == None:
+            after = ('', 0)
+
+        self.c.execute('''
+            SELECT
+                Records.Id AS RecordId,
+                Records.Date AS Date,
+                Player1.Name AS Player1,
+                Player2.Name AS Player2,
+                Winner.Name AS Winner
+
+            FROM MatchRecords AS Records
+            JOIN Players AS Player1 ON Player1.Id = Records.Player1Id
+            JOIN Players AS Player2 ON Player2.Id = Records.Player2Id
+            JOIN Players AS Winner ON Winner.Id = Records.WinnerId
+
+            WHERE Records.GameId = ? AND (Records.Date, Records.Id) > (?, ?)
+
+            ORDER BY Records.Date, Records.Id
+            LIMIT ?;''', (int(game), after[0], after[1], limit))
+
+        return self.c.fetchall()
+
+
+    def record_filter(self, p1=None, p2=None, game=None, winner=None, start=None, end=None):
+        '''Returns (where clause, args) for MatchRecords filtered by ids and date range, None for any'''
+        clauses, args = [], []
+
+        if p1 != None and p2 != None: # Both players, either side
+            clauses.append('((Records.Player1Id = ? AND Records.Player2Id = ?) OR (Records.Player1Id = ? AND Records.Player2Id = ?))')
+            args += [int(p1), int(p2), int(p2), int(p1)]
+        elif p1 != None or p2 != None: # One player, either side
+            p = p1 if p1 != None else p2
+            clauses.append('(Records.Player1Id = ? OR Records.Player2Id = ?)')
+            args += [int(p), int(p)]
+
+        if game != None:
+            clauses.append('Records.GameId = ?')
+            args.append(int(game))
+
+        if winner != None:
+            clauses.append('Records.WinnerId = ?')
+            args.append(int(winner))
+
+        if start != None:
+            clauses.append('Records.Date >= ?')
+            args.append(start)
+
+        if end != None:
+            clauses.append('Records.Date <= ?')
+            args.append(end)
+
+        if clauses:
+            return 'WHERE ' + ' AND '.join(clauses), tuple(args)
+
+        return '', ()
+
+
+    def match_records(self, p1=None, p2=None, game=None, winner=None, start=None, end=None):
+        '''Returns (RecordId, Date, Player1, Player2, Winner, Game) for records matching all provided filters
+
+        Players, game and winner are ids, start and end are inclusive dates - omit any for wildcard'''
+        where, args = self.record_filter(p1, p2, game, winner, start, end)
+        self.c.execute('''
+            SELECT
+                Records.Id AS RecordId,
+                Records.Date AS Date,
+                Player1.Name AS Player1,
+                Player2.Name AS Player2,
+                Winner.Name AS Winner,
+                Games.Name AS Game
+
+            FROM MatchRecords AS Records
+            JOIN Players AS Player1 ON Player1.Id = Records.Player1Id
+            JOIN Players AS Player2 ON Player2.Id = Records.Player2Id
+            JOIN Players AS Winner ON Winner.Id = Records.WinnerId
+            JOIN Games ON Games.Id = Records.GameId
+
+            {}
+
+            ORDER BY Game, Date;'''.format(where), args)
+
+        return self.c.fetchall()
+
+
+    def head_to_head(self, p1, p2):
+        '''Accepts two player ids, returns a list of tuples (Game, P1Wins, P2Wins, LastMatch) for each game they have played'''
+        low, high = min(int(p1), int(p2)), max(int(p1), int(p2))
+        self.c.execute('''
+            SELECT Games.Name, H2H.LowWins, H2H.HighWins, H2H.LastMatch
+            FROM HeadToHead AS H2H
+            JOIN Games ON Games.Id = H2H.GameId
+            WHERE H2H.PlayerLow = ? AND H2H.PlayerHigh = ?
+            ORDER BY Games.Name;''', (low, high))
+
+        results = self.c.fetchall()
+        if low != int(p1): # Stored lower id first, flip to match argument order
+            results = [(r[0], r[2], r[1], r[3]) for r in results]
+
+        return results
+
+
+    def rivalries(self, game):
+        '''Accepts a game id, returns a list of tuples (Player1, Player2, P1Wins, P2Wins, LastMatch), most played first'''
+        self.c.execute('''
+            SELECT Low.Name, High.Name, H2H.LowWins, H2H.HighWins, H2H.LastMatch
+            FROM HeadToHead AS H2H
+            JOIN Players AS Low ON Low.Id = H2H.PlayerLow
+            JOIN Players AS High ON High.Id = H2H.PlayerHigh
+            WHERE H2H.GameId = ?
+            ORDER BY H2H.LowWins + H2H.HighWins DESC, H2H.LastMatch DESC;''', (int(game),))
+
+        return self.c.fetchall()
+
+
+    def game_standings(self, game):
+        '''Accepts a game id, returns a list of tuples (Name, Rating, Wins, Matches) for active players, best rated first'''
+        self.c.execute('''
+            SELECT
+                Players.Name AS Name,
+                Ratings.Rating AS Rating,
+                (SELECT IFNULL(SUM(LowWins), 0) FROM HeadToHead WHERE GameId = Ratings.GameId AND PlayerLow = Ratings.PlayerId)
+                    + (SELECT IFNULL(SUM(HighWins), 0) FROM HeadToHead WHERE GameId = Ratings.GameId AND PlayerHigh = Ratings.PlayerId) AS Wins,
+                Ratings.Matches AS Matches
+
+            FROM Ratings
+            JOIN Players ON Players.Id = Ratings.PlayerId
+
+            WHERE Ratings.GameId = ? AND Players.IsActive = 1
+
+            ORDER BY Ratings.Rating DESC;''', (int(game),))
+
+        return self.c.fetchall()
 
-            FROM MatchRecords as Records
 
-            WHERE (Records.Player1Id LIKE ? OR Records.Player2ID LIKE ?)
-                AND (Records.Player1Id LIKE ? OR Player2Id LIKE ?)
-                AND Records.GameId LIKE ?
+    def glicko_standings(self, game):
+        '''Accepts a game id, returns a list of tuples (Name, Rating, Deviation, Volatility) for active players, best rated first
 
-            ORDER BY Game, Date;''', args)
+        Ratings are as of the last Data.refresh_glicko, see glicko_stale'''
+        self.c.execute('''
+            SELECT Players.Name, Glicko.Rating, Glicko.Deviation, Glicko.Volatility
+            FROM Glicko
+            JOIN Players ON Players.Id = Glicko.PlayerId
+            WHERE Glicko.GameId = ? AND Players.IsActive = 1
+            ORDER BY Glicko.Rating DESC;''', (int(game),))
 
         return self.c.fetchall()
 
 
+    def glicko_stale(self, game):
+        '''Returns True if a game's Glicko-2 ratings are waiting for Data.refresh_glicko'''
+        self.c.execute('SELECT COUNT(*) FROM GlickoStale WHERE GameId = ?;', (int(game),))
+        return self.c.fetchone()[0] > 0
+
+
+    def head_to_head_matrix(self, game, isActive=True):
+        '''Accepts a game id, returns (names, wins) where wins[i][j] is how often names[i] beat names[j]'''
+        if isActive:
+            self.c.execute('SELECT Id, Name FROM Players WHERE IsActive = 1 ORDER BY Name;')
+        else:
+            self.c.execute('SELECT Id, Name FROM Players ORDER BY Name;')
+        players = self.c.fetchall()
+
+        index = {}
+        for i, p in enumerate(players):
+            index[p[0]] = i
+        wins = [[0] * len(players) for p in players]
+
+        self.c.execute('SELECT PlayerLow, PlayerHigh, LowWins, HighWins FROM HeadToHead WHERE GameId = ?;', (int(game),))
+        for low, high, lowWins, highWins in self.c.fetchall():
+            if low in index and high in index:
+                wins[index[low]][index[high]] = lowWins
+                wins[index[high]][index[low]] = highWins
+
+        return [p[1] for p in players], wins
+
+
+    def export_cursor(self, table):
+        '''Returns a new cursor over every row of 'records', 'players' or 'games' for streaming with fetchmany'''
+        queries = {
+            'records': '''
+                SELECT
+                    Records.Id AS Id,
+                    Games.Name AS Game,
+                    Player1.Name AS Player1,
+                    Player2.Name AS Player2,
+                    Winner.Name AS Winner,
+                    Records.Date AS Date
+
+                FROM MatchRecords AS Records
+                JOIN Players AS Player1 ON Player1.Id = Records.Player1Id
+                JOIN Players AS Player2 ON Player2.Id = Records.Player2Id
+                JOIN Players AS Winner ON Winner.Id = Records.WinnerId
+                JOIN Games ON Games.Id = Records.GameId
+
+                ORDER BY Records.Id;''',
+
+            'players': '''
+                SELECT Players.Id AS Id, Players.Name AS Name, Players.IsActive AS IsActive,
+                    IFNULL(Stats.Wins, 0) AS Wins, IFNULL(Stats.Matches, 0) AS Matches, Stats.LastMatch AS LastMatch
+                FROM Players
+                LEFT JOIN PlayerStats AS Stats ON Stats.PlayerId = Players.Id
+                ORDER BY Players.Id;''',
+
+            'games': '''
+                SELECT Games.Id AS Id, Games.Name AS Name, Games.Developer AS Developer, Games.Platform AS Platform,
+                    Games.ReleaseYear AS ReleaseYear, Games.IsActive AS IsActive,
+                    IFNULL(Stats.Matches, 0) AS Matches, Stats.LastMatch AS LastMatch
+                FROM Games
+                LEFT JOIN GameStats AS Stats ON Stats.GameId = Games.Id
+                ORDER BY Games.Id;''',
+        }
+
+        cursor = self.db.cursor()
+        cursor.execute(queries[table])
+        return cursor
+
+
+
+class Identities:
+    def __init__(self, query):
+        '''In-memory name->id and status cache for players and games, loaded on first use'''
+        self.query = query
+        self.players = None # key=name, value=[id, isActive]
+        self.games = None # key=name, value=[id, isActive]
+
+        # Counters for inspecting cache behaviour
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+
+    def load(self):
+        '''Reads all players and games from the database'''
+        self.players = {}
+        status = self.query.all_player_status()
+        for name, pid in self.query.all_player_ids().items():
+            self.players[name] = [pid, status[name]]
+
+        self.games = {}
+        status = self.query.all_game_status()
+        for name, gid in self.query.all_game_ids().items():
+            self.games[name] = [gid, status[name]]
+
+        self.loads += 1
+
+
+    def invalidate(self):
+        '''Drops cached entries, the next lookup reloads from the database'''
+        self.players = None
+        self.games = None
+
+
+    def lookup(self, table, name):
+        '''Returns [id, isActive] for name in table ('player' or 'game'), or None if missing
+
+        Misses are checked against the database, since another process may have added the entry'''
+        if self.players == None:
+            self.load()
+
+        entries = self.players if table == 'player' else self.games
+        entry = entries.get(name)
+        if entry == None:
+            self.misses += 1
+            entry = self.query.player_entry(name) if table == 'player' else self.query.game_entry(name)
+            if entry != None:
+                entries[name] = entry
+        else:
+            self.hits += 1
+
+        return entry
+
+
+    def player_id(self, name):
+        '''Returns id for player name, raises KeyError if missing'''
+        entry = self.lookup('player', name)
+        if entry == None:
+            raise KeyError(name)
+        return entry[0]
+
+
+    def game_id(self, name):
+        '''Returns id for game name, raises KeyError if missing'''
+        entry = self.lookup('game', name)
+        if entry == None:
+            raise KeyError(name)
+        return entry[0]
+
+
+    def player_status(self, name):
+        '''Returns 1 for active players, 0 for inactive, None if missing'''
+        entry = self.lookup('player', name)
+        return None if entry == None else entry[1]
+
+
+    def game_status(self, name):
+        '''Returns 1 for active games, 0 for inactive, None if missing'''
+        entry = self.lookup('game', name)
+        return None if entry == None else entry[1]
+
+
+    def add(self, table, name, newId):
+        '''Adds a newly created active entry'''
+        if self.players != None:
+            (self.players if table == 'player' else self.games)[name] = [newId, 1]
+
+
+    def set_status(self, table, name, isActive):
+        '''Updates the active flag of an existing entry'''
+        if self.players != None:
+            entry = (self.players if table == 'player' else self.games).get(name)
+            if entry != None:
+                entry[1] = isActive
+
+
+    def stats(self):
+        '''Returns a dict of cache counters'''
+        return {'hits': self.hits, 'misses': self.misses, 'loads': self.loads}
+
+
 
 class Data:
-    def __init__(self):
+    def __init__(self, path=None):
         '''Top-level data management object, holds data on players, games, tags, config, and records'''
         self.init_dir()
-        self.path = os.path.join('data', 'records.db')
+        self.path = path if path else os.path.join('data', 'records.db')
+        self.config = Config()
 
         if os.path.isfile(self.path):
-            self.db = sqlite3.connect(self.path) # Connection
-            self.c = self.db.cursor() # Cursor
+            self.connect()
         else:
             self.init_db()
 
-        self.query = Query(self.db, self.c)
-        self.config = Config()
+        applied = self.migrate()
+        self.profiler = None # QueryProfiler while profiling is enabled
+        if self.config.settings.get('profile_queries'):
+            self.enable_profiling()
+        self.query = Query(self.reader, self.reader.cursor(), self.profiler)
+        self.ratings = Elo(self.db)
+        self.glicko = Glicko2(self.db)
+        self.streaks = Streaks(self.db)
+        self.identities = Identities(self.query)
+        self.events = EventBus() # Receives ('match', last record id) after matches are committed
+        self.version = 0 # Incremented on each commit that changes players or match records
+        self.deferred = None # (game ids, player ids) awaiting replay during a bulk import, see defer_replays
+        self.executor = QueryExecutor(self.open_query, 0 if self.path == ':memory:' else 2) # Background reads for the UI
+
+        if Elo.migration in applied or Glicko2.migration in applied: # Rating tables are new, populate from records
+            self.rebuild_ratings()
+        if Streaks.migration in applied: # Streaks table is new, populate from records
+            self.rebuild_stats()
 
 
     def init_dir(self):
@@ -249,11 +704,68 @@ class Data:
             sys.exit()
 
 
+    def connect(self):
+        '''Opens the write connection and a separate read connection for Query, both tuned by the config pragma profile
+
+        In WAL mode the reader sees the last committed state while the writer is mid-transaction'''
+        pragmas = self.config.pragmas()
+        self.db = sqlite3.connect(self.path) # Write connection
+        self.c = self.db.cursor() # Write cursor
+        self.set_pragmas(self.db, pragmas)
+
+        if self.path == ':memory:': # Nothing to share, read from the same database
+            self.reader = self.db
+        else:
+            self.reader = sqlite3.connect(self.path) # Read connection
+            self.set_pragmas(self.reader, pragmas)
+
+
+    def open_query(self):
+        '''Returns a Query on a new read connection, used by executor worker threads'''
+        if self.path == ':memory:':
+            return self.query
+
+        conn = sqlite3.connect(self.path)
+        self.set_pragmas(conn, self.config.pragmas())
+        return Query(conn, conn.cursor(), self.profiler)
+
+
+    def enable_profiling(self):
+        '''Starts timing every Query statement, slow ones are appended to data/slow_queries.log
+
+        The threshold comes from the slow_query_ms setting. Worker threads started later share the profiler'''
+        self.profiler = QueryProfiler(self.config.settings.get('slow_query_ms', 100), os.path.join('data', 'slow_queries.log'))
+        if hasattr(self, 'query'):
+            self.query.c = ProfiledCursor(self.query.c, self.profiler)
+        return self.profiler
+
+
+    def set_pragmas(self, conn, pragmas):
+        '''Applies a dict of pragma name -> value to a connection'''
+        for name, value in pragmas.items():
+            if not name.replace('_', '').isalpha():
+                continue # Names cannot be bound as parameters, skip anything unexpected
+            conn.execute('PRAGMA {} = {};'.format(name, int(value) if isinstance(value, (int, float)) else "'{}'".format(str(value).replace("'", ""))))
+
+
+    def close(self):
+        '''Stops background queries and closes both database connections
+
+        The WAL is checkpointed first, since cursors still referenced elsewhere delay the checkpoint sqlite makes on close'''
+        self.executor.shutdown()
+        if self.reader is not self.db:
+            self.reader.close()
+        try:
+            self.db.execute('PRAGMA wal_checkpoint(TRUNCATE);')
+        except sqlite3.Error: # Another connection is busy, it checkpoints later
+            pass
+        self.db.close()
+
+
     def init_db(self):
         '''Creates initial db tables'''
         try:
-            self.db = sqlite3.connect(self.path) # Connection
-            self.c = self.db.cursor() # Cursor
+            self.connect()
 
             with open(os.path.join("src", "sql", "create_db_tables.sql")) as script:
                 cmd = script.read()
@@ -264,11 +776,240 @@ class Data:
             sys.exit()
 
 
+    def schema_version(self):
+        '''Returns the schema version stored in the database header'''
+        self.c.execute('PRAGMA user_version;')
+        return self.c.fetchone()[0]
+
+
+    def migrate(self):
+        '''Applies any pending scripts in src/sql/migrations, tracked with PRAGMA user_version, returns versions applied'''
+        migrationDir = os.path.join("src", "sql", "migrations")
+        current = self.schema_version()
+        applied = []
+
+        for fileName in sorted(os.listdir(migrationDir)):
+            if not fileName.endswith('.sql'):
+                continue
+
+            version = int(fileName.split('_')[0])
+            if version <= current:
+                continue
+
+            try:
+                with open(os.path.join(migrationDir, fileName)) as script:
+                    cmd = script.read()
+                    self.c.executescript('BEGIN;\n{}\nPRAGMA user_version = {};\nCOMMIT;'.format(cmd, version))
+            except:
+                self.db.rollback()
+                print("Unable to apply migration {}! Exiting...".format(fileName))
+                sys.exit()
+
+            current = version
+            applied.append(version)
+
+        return applied
+
+
+    def rebuild_stats(self):
+        '''Recalculates PlayerStats, GameStats, HeadToHead and Streaks from scratch using all match records'''
+        self.c.execute('DELETE FROM PlayerStats;')
+        self.c.execute('''
+            INSERT INTO PlayerStats (PlayerId, Wins, Matches, LastMatch)
+            SELECT PlayerId, SUM(Won), COUNT(*), MAX(Date)
+            FROM (
+                SELECT Player1Id AS PlayerId, WinnerId = Player1Id AS Won, Date FROM MatchRecords
+                UNION ALL
+                SELECT Player2Id AS PlayerId, WinnerId = Player2Id AS Won, Date FROM MatchRecords
+            )
+            GROUP BY PlayerId;''')
+
+        self.c.execute('DELETE FROM GameStats;')
+        self.c.execute('''
+            INSERT INTO GameStats (GameId, Matches, LastMatch)
+            SELECT GameId, COUNT(*), MAX(Date)
+            FROM MatchRecords
+            GROUP BY GameId;''')
+
+        self.c.execute('DELETE FROM HeadToHead;')
+        self.c.execute('''
+            INSERT INTO HeadToHead (GameId, PlayerLow, PlayerHigh, LowWins, HighWins, LastMatch)
+            SELECT GameId, MIN(Player1Id, Player2Id), MAX(Player1Id, Player2Id),
+                SUM(WinnerId = MIN(Player1Id, Player2Id)), SUM(WinnerId = MAX(Player1Id, Player2Id)), MAX(Date)
+            FROM MatchRecords
+            GROUP BY GameId, MIN(Player1Id, Player2Id), MAX(Player1Id, Player2Id);''')
+
+        self.streaks.rebuild()
+        self.db.commit()
+        self.version += 1
+
+
+    def rebuild_ratings(self):
+        '''Recalculates all Elo ratings in one chronological pass, and Glicko-2 ratings one period at a time'''
+        self.ratings.rebuild()
+        self.glicko.rebuild()
+        self.db.commit()
+
+
+    def refresh_glicko(self):
+        '''Replays Glicko-2 ratings for games changed since they were last calculated, call before reading them'''
+        if self.glicko.refresh():
+            self.db.commit()
+
+
+    def update_stats(self, records):
+        '''Applies a list of converted match records to the summary stat tables, does not commit'''
+        players, games = {}, {} # Deltas, key=id, value=[wins, matches, last] or [matches, last]
+        pairs = {} # Deltas, key=(game, low id, high id), value=[low wins, high wins, last]
+        for r in records:
+            for p in (r['p1'], r['p2']):
+                delta = players.setdefault(p, [0, 0, r['date']])
+                delta[0] += int(r['win'] == p)
+                delta[1] += 1
+                delta[2] = max(delta[2], r['date'])
+
+            delta = games.setdefault(r['game'], [0, r['date']])
+            delta[0] += 1
+            delta[1] = max(delta[1], r['date'])
+
+            low, high = min(r['p1'], r['p2']), max(r['p1'], r['p2'])
+            delta = pairs.setdefault((r['game'], low, high), [0, 0, r['date']])
+            delta[0] += int(r['win'] == low)
+            delta[1] += int(r['win'] == high)
+            delta[2] = max(delta[2], r['date'])
+
+        self.c.executemany('''
+            INSERT INTO PlayerStats (PlayerId, Wins, Matches, LastMatch) VALUES (?,?,?,?)
+            ON CONFLICT(PlayerId) DO UPDATE SET
+                Wins = Wins + excluded.Wins,
+                Matches = Matches + excluded.Matches,
+                LastMatch = MAX(IFNULL(LastMatch, excluded.LastMatch), excluded.LastMatch);''',
+            [(p, d[0], d[1], d[2]) for p, d in players.items()])
+
+        self.c.executemany('''
+            INSERT INTO GameStats (GameId, Matches, LastMatch) VALUES (?,?,?)
+            ON CONFLICT(GameId) DO UPDATE SET
+                Matches = Matches + excluded.Matches,
+                LastMatch = MAX(IFNULL(LastMatch, excluded.LastMatch), excluded.LastMatch);''',
+            [(g, d[0], d[1]) for g, d in games.items()])
+
+        self.c.executemany('''
+            INSERT INTO HeadToHead (GameId, PlayerLow, PlayerHigh, LowWins, HighWins, LastMatch) VALUES (?,?,?,?,?,?)
+            ON CONFLICT(GameId, PlayerLow, PlayerHigh) DO UPDATE SET
+                LowWins = LowWins + excluded.LowWins,
+                HighWins = HighWins + excluded.HighWins,
+                LastMatch = MAX(IFNULL(LastMatch, excluded.LastMatch), excluded.LastMatch);''',
+            [(k[0], k[1], k[2], d[0], d[1], d[2]) for k, d in pairs.items()])
+
+
+    def late_entries(self, latest, table, column, ids, date):
+        '''Returns the subset of ids whose LastMatch in a stats table is after date, latest dict caches lookups'''
+        late = set()
+        for i in ids:
+            if i not in latest:
+                self.c.execute('SELECT LastMatch FROM {} WHERE {} = ?'.format(table, column), (i,))
+                row = self.c.fetchone()
+                latest[i] = row[0] if row != None else None
+            if latest[i] != None and latest[i] > date:
+                late.add(i)
+        return late
+
+
+    def late_records(self, records):
+        '''Returns (game ids, player ids) with a stored match dated after one of records, call before update_stats'''
+        gameLatest, playerLatest = {}, {}
+        games, players = set(), set()
+        for r in records:
+            games |= self.late_entries(gameLatest, 'GameStats', 'GameId', [r['game']], r['date'])
+            players |= self.late_entries(playerLatest, 'PlayerStats', 'PlayerId', [r['p1'], r['p2']], r['date'])
+        return games, players
+
+
+    def apply_records(self, records):
+        '''Applies newly inserted records to stats, streaks and ratings, does not commit
+
+        Ratings and streaks depend on match order, so games and players where a record lands before
+        existing matches are replayed instead'''
+        lateGames, latePlayers = self.late_records(records)
+        records = sorted(records, key=lambda r: r['date']) # Stable, equal dates keep insertion (Id) order like rebuilds
+
+        self.update_stats(records)
+        if self.deferred != None: # Bulk import, replay_deferred replays back-dated games and players once
+            self.deferred[0].update(lateGames)
+            self.deferred[1].update(latePlayers)
+            if not self.deferred[1]: # Streaks are rebuilt in full once any player is back-dated
+                self.streaks.apply(records)
+            self.ratings.apply([r for r in records if r['game'] not in self.deferred[0]])
+        else:
+            self.streaks.apply(records)
+            if latePlayers: # Overwrites what apply wrote for these players
+                self.streaks.rebuild(latePlayers)
+            self.ratings.apply([r for r in records if r['game'] not in lateGames])
+            for game in lateGames:
+                self.ratings.rebuild(game)
+        self.glicko.mark_stale([r['game'] for r in records])
+
+
+    def defer_replays(self):
+        '''Collects back-dated games and players instead of replaying them for every batch, call replay_deferred when done
+
+        Streaks and ratings of collected entries are wrong until then'''
+        self.deferred = (set(), set())
+
+
+    def replay_deferred(self):
+        '''Replays streaks and ratings collected since defer_replays in one pass each, then commits'''
+        if self.deferred == None:
+            return
+        games, players = self.deferred
+        self.deferred = None
+        if players:
+            self.streaks.rebuild()
+        for game in games:
+            self.ratings.rebuild(game)
+
+        if games or players:
+            self.db.commit()
+            self.version += 1
+
+
+    def refresh_stats(self, matches):
+        '''Recalculates summary stats touched by a list of (GameId, Player1Id, Player2Id), does not commit'''
+        playerIds = set([m[1] for m in matches] + [m[2] for m in matches])
+        gameIds = set([m[0] for m in matches])
+        pairs = set([(m[0], min(m[1], m[2]), max(m[1], m[2])) for m in matches])
+
+        for p in playerIds:
+            self.c.execute('''
+                INSERT OR REPLACE INTO PlayerStats (PlayerId, Wins, Matches, LastMatch)
+                SELECT ?,
+                    (SELECT COUNT(*) FROM MatchRecords WHERE WinnerId = ?),
+                    (SELECT COUNT(*) FROM MatchRecords WHERE Player1Id = ? OR Player2Id = ?),
+                    (SELECT MAX(Date) FROM MatchRecords WHERE Player1Id = ? OR Player2Id = ?);''',
+                (p,) * 6)
+
+        for g in gameIds:
+            self.c.execute('''
+                INSERT OR REPLACE INTO GameStats (GameId, Matches, LastMatch)
+                SELECT ?, COUNT(*), MAX(Date) FROM MatchRecords WHERE GameId = ?;''', (g, g))
+
+        for g, low, high in pairs:
+            self.c.execute('DELETE FROM HeadToHead WHERE GameId = ? AND PlayerLow = ? AND PlayerHigh = ?', (g, low, high))
+            self.c.execute('''
+                INSERT INTO HeadToHead (GameId, PlayerLow, PlayerHigh, LowWins, HighWins, LastMatch)
+                SELECT ?, ?, ?, SUM(WinnerId = ?), SUM(WinnerId = ?), MAX(Date)
+                FROM MatchRecords
+                WHERE GameId = ? AND ((Player1Id = ? AND Player2Id = ?) OR (Player1Id = ? AND Player2Id = ?))
+                HAVING COUNT(*) > 0;''', (g, low, high, low, high, g, low, high, high, low))
+
+
     def new_player(self, name):
         '''Creates a new player record with the provided name'''
         try:
             self.c.execute('INSERT INTO "Players" ("Name") VALUES (?)', (name,))
             self.db.commit()
+            self.version += 1
+            self.identities.add('player', name, self.c.lastrowid)
         except:
             print("Unable to add player! Exiting...")
             sys.exit()
@@ -279,6 +1020,7 @@ class Data:
         try:
             self.c.execute('INSERT INTO "Games" ("Name","Developer","Platform","ReleaseYear") VALUES (?,?,?,?)', (name, developer, platform, release))
             self.db.commit()
+            self.identities.add('game', name, self.c.lastrowid)
         except:
             print("Unable to add game! Exiting...")
             sys.exit()
@@ -289,6 +1031,8 @@ class Data:
         try:
             self.c.execute('UPDATE Players SET IsActive=1 WHERE Name=?', (name,))
             self.db.commit()
+            self.version += 1
+            self.identities.set_status('player', name, 1)
         except:
             print("Unable to activate player! Exiting...")
             sys.exit()
@@ -299,6 +1043,7 @@ class Data:
         try:
             self.c.execute('UPDATE Games SET IsActive=1 WHERE Name=?', (name,))
             self.db.commit()
+            self.identities.set_status('game', name, 1)
         except:
             print("Unable to activate game! Exiting...")
             sys.exit()
@@ -309,6 +1054,8 @@ class Data:
         try:
             self.c.execute('UPDATE Players SET IsActive=0 WHERE Name=?', (name,))
             self.db.commit()
+            self.version += 1
+            self.identities.set_status('player', name, 0)
         except:
             print("Unable to deactivate player! Exiting...")
             sys.exit()
@@ -319,6 +1066,7 @@ class Data:
         try:
             self.c.execute('UPDATE Games SET IsActive=0 WHERE Name=?', (name,))
             self.db.commit()
+            self.identities.set_status('game', name, 0)
         except:
             print("Unable to deactivate game! Exiting...")
             sys.exit()
@@ -342,10 +1090,12 @@ class Data:
         illegal = [',', '\\', '.', "/", "`", "~"]
         err = 0
 
-        if name in self.query.all_player_names(True): # Name in use
+        status = self.identities.player_status(name)
+
+        if status == 1: # Name in use
             err = 1
 
-        elif name in self.query.all_player_names(False): # Name in-use, but inactive
+        elif status == 0: # Name in-use, but inactive
             err = 2
 
         elif name.lower() in reserved: # Name is on reserved list
@@ -368,10 +1118,12 @@ class Data:
         illegal = [',', '\\', '.', "/", "`", "~"]
         err = 0
 
-        if name in self.query.all_game_names(True): # Name in-use
+        status = self.identities.game_status(name)
+
+        if status == 1: # Name in-use
             err = 1
 
-        elif name in self.query.all_game_names(False): # Name in-use, but inactive
+        elif status == 0: # Name in-use, but inactive
             err = 2
 
         elif name.lower() in reserved: # Name is on reserved list
@@ -388,16 +1140,21 @@ class Data:
         return err
 
 
-    def convert_match(self, match):
-        '''Accepts match dict containing names, returns dict of ids'''
-        playerIDs = self.query.all_player_ids()
-        gameIDs = self.query.all_game_ids()
+    def validate_date(self, date):
+        '''Returns True for YYYY-MM-DD dates, records are ordered by comparing dates as text'''
+        try:
+            return datetime.datetime.strptime(date, '%Y-%m-%d').strftime('%Y-%m-%d') == date
+        except (TypeError, ValueError):
+            return False
 
+
+    def convert_match(self, match):
+        '''Accepts match dict containing names, returns dict of ids, raises KeyError for unknown names'''
         converted = {}
-        converted['game'] = gameIDs[match['game']]
-        converted['p1'] = playerIDs[match['p1']]
-        converted['p2'] = playerIDs[match['p2']]
-        converted['win'] = playerIDs[match['win']]
+        converted['game'] = self.identities.game_id(match['game'])
+        converted['p1'] = self.identities.player_id(match['p1'])
+        converted['p2'] = self.identities.player_id(match['p2'])
+        converted['win'] = self.identities.player_id(match['win'])
         converted['date'] = match['date']
 
         return converted
@@ -406,8 +1163,90 @@ class Data:
     def record_match(self, match):
         '''Records a single match to the Records table'''
         record = self.convert_match(match)
-        args = ()
         self.c.execute('''
             INSERT INTO "MatchRecords" (GameId, Player1Id, Player2Id, WinnerId, Date)
             VALUES (?,?,?,?,?)''', (record['game'], record['p1'], record['p2'], record['win'], record['date']))
+        recordId = self.c.lastrowid
+        self.apply_records([record])
         self.db.commit()
+        self.version += 1
+        self.events.publish(('match', recordId))
+
+
+    def record_matches(self, matches):
+        '''Records many match dicts in a single transaction, returns a list of (index, match, error) for rejected rows'''
+        records, failed = [], []
+        for i, match in enumerate(matches):
+            try:
+                record = self.convert_match(match)
+            except KeyError as e:
+                failed.append((i, match, 'Unknown or missing entry: {}'.format(e.args[0])))
+                continue
+
+            if record['p1'] == record['p2']:
+                failed.append((i, match, 'Players must be different'))
+            elif record['win'] not in (record['p1'], record['p2']):
+                failed.append((i, match, 'Winner must be one of the players'))
+            elif not record['date']:
+                failed.append((i, match, 'Missing date'))
+            elif not self.validate_date(record['date']):
+                failed.append((i, match, 'Date must be YYYY-MM-DD'))
+            else:
+                records.append(record)
+
+        try:
+            self.c.executemany('''
+                INSERT INTO "MatchRecords" (GameId, Player1Id, Player2Id, WinnerId, Date)
+                VALUES (?,?,?,?,?)''', [(r['game'], r['p1'], r['p2'], r['win'], r['date']) for r in records])
+            self.apply_records(records)
+            self.db.commit()
+        except:
+            self.db.rollback()
+            print("Unable to record matches! Exiting...")
+            sys.exit()
+
+        if records:
+            self.version += 1
+            self.events.publish(('match', self.query.last_record_id()))
+
+        return failed
+
+
+    def match_ids(self, recordId):
+        '''Returns (GameId, Player1Id, Player2Id) for a single record, or None if missing'''
+        self.c.execute('SELECT GameId, Player1Id, Player2Id FROM MatchRecords WHERE Id = ?', (recordId,))
+        return self.c.fetchone()
+
+
+    def edit_match(self, recordId, match):
+        '''Replaces a single match in the Records table with the provided match dict'''
+        old = self.match_ids(recordId)
+        if old != None:
+            record = self.convert_match(match)
+            self.c.execute('''
+                UPDATE MatchRecords
+
+                SET GameId = ?, Player1Id = ?, Player2Id = ?, WinnerId = ?, Date = ?
+
+                WHERE Id = ?''', (record['game'], record['p1'], record['p2'], record['win'], record['date'], recordId))
+
+            self.refresh_stats([old, (record['game'], record['p1'], record['p2'])])
+            self.streaks.rebuild([old[1], old[2], record['p1'], record['p2']])
+            for game in set([old[0], record['game']]): # Later ratings depend on this match, replay the game
+                self.ratings.rebuild(game)
+            self.glicko.mark_stale([old[0], record['game']])
+            self.db.commit()
+            self.version += 1
+
+
+    def delete_match(self, recordId):
+        '''Removes a single match from the Records table'''
+        old = self.match_ids(recordId)
+        if old != None:
+            self.c.execute('DELETE FROM MatchRecords WHERE Id = ?', (recordId,))
+            self.refresh_stats([old])
+            self.streaks.rebuild([old[1], old[2]])
+            self.ratings.rebuild(old[0])
+            self.glicko.mark_stale([old[0]])
+            self.db.commit()
+            self.version += 1
@@ -1,9 +1,19 @@
 import tkinter as tk
 import tkinter.ttk as ttk
 from src.message import *
+from src.worker import Loader
 import os, sys
 
 
+def format_streak(streak):
+    '''Returns a signed streak count as text, e.g. W3 or L2'''
+    if streak > 0:
+        return 'W{}'.format(streak)
+    elif streak < 0:
+        return 'L{}'.format(-streak)
+    return ''
+
+
 class AddPlayer:
     def open(self, manage, data):
         '''Opens the Add Player window'''
@@ -176,6 +186,7 @@ class ManagePlayers:
         self.top.title("Manage Players")
         self.top.wm_attributes("-topmost", True)
 
+        self.loader = Loader(self.top, data.executor)
         self.mainFrame = tk.Frame(self.top)
         self.tree = self.build_tree(self.mainFrame, data)
         self.scrollbar = ttk.Scrollbar(self.mainFrame, orient="vertical", command=self.tree.yview)
@@ -194,9 +205,9 @@ class ManagePlayers:
 
 
     def build_tree(self, root, data):
-        '''Builds player data tree'''
+        '''Builds player data tree, rows are filled in once player details load in the background'''
         tree = ttk.Treeview(root)
-        tree['columns'] = ('wins','matches','last')
+        tree['columns'] = ('wins','matches','last','elo','streak','form')
 
         tree.tag_configure('0', background='#E8E8E8')
         tree.tag_configure('1', background='#DFDFDF')
@@ -205,20 +216,34 @@ class ManagePlayers:
         tree.column('wins',width=60)
         tree.column('matches',width=80)
         tree.column('last',width=80)
+        tree.column('elo',width=60)
+        tree.column('streak',width=60)
+        tree.column('form',width=60)
 
         tree.heading('#0', text='Player', anchor=tk.W)
         tree.heading('wins', text='Wins', anchor=tk.W)
         tree.heading('matches', text='Matches', anchor=tk.W)
         tree.heading('last', text='Last', anchor=tk.W)
+        tree.heading('elo', text='Best Elo', anchor=tk.W)
+        tree.heading('streak', text='Streak', anchor=tk.W)
+        tree.heading('form', text='Form', anchor=tk.W)
 
-        c = 0
-        for p in data.query.all_player_details(True):
-            tree.insert('', tk.END, text=p[1], values=[p[2],p[3],p[4]], tag=str(c%2))
-            c += 1
+        tree.insert('', tk.END, text='Loading...')
+        self.loader.load('players', lambda q: q.all_player_details(True), lambda rows, t=tree: self.fill_tree(t, rows))
 
         return tree
 
 
+    def fill_tree(self, tree, rows):
+        '''Replaces the loading row with player details'''
+        tree.delete(*tree.get_children())
+        c = 0
+        for p in rows:
+            elo = '' if p[5] == None else round(p[5])
+            tree.insert('', tk.END, text=p[1], values=[p[2],p[3],p[4],elo,format_streak(p[6]),p[7]], tag=str(c%2))
+            c += 1
+
+
     def refresh_tree(self, data):
         '''Rebuilds and re-packs the tree'''
         self.tree.destroy()
@@ -0,0 +1,35 @@
+import queue, threading
+
+
+class EventBus:
+    def __init__(self):
+        '''In-process publish/subscribe for data changes, safe to use across threads'''
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+
+    def subscribe(self):
+        '''Returns a new queue that receives every event published after this call'''
+        q = queue.Queue(maxsize=1000)
+        with self.lock:
+            self.subscribers.append(q)
+        return q
+
+
+    def unsubscribe(self, q):
+        '''Stops delivering events to a queue from subscribe'''
+        with self.lock:
+            if q in self.subscribers:
+                self.subscribers.remove(q)
+
+
+    def publish(self, event):
+        '''Delivers event to every subscriber, dropping it for any that have fallen behind'''
+        with self.lock:
+            subscribers = list(self.subscribers)
+
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full: # Subscriber catches up from its cursor instead
+                pass
@@ -1,89 +1,158 @@
 import tkinter as tk
 import tkinter.ttk as ttk
-import os, sys
+import tkinter.filedialog as filedialog
+import os, sys, json, time
 from src.edit import *
 from src.match import *
+from src.worker import Loader
+from src.avatars import avatars
+from src.metrics import RateCounter, Timings, LoopMonitor
 
 
 class PlayerIcons:
-    def __init__(self, root, data):
-        '''Contains all individual player buttons'''
-        self.root = root
-        self.icons = {} # Dict of player buttons
-        self.avatars = {} # Dict of player avatars
-        self.avatars['default'] = tk.PhotoImage(master=self.root, file=os.path.join('img', 'avatars', 'default.png'))
+    cellWidth = 110 # Horizontal space per player button
+    overscan = 1 # Rows kept rendered above and below the visible area
+
+    def __init__(self, canvas, data):
+        '''Grid of player buttons drawn on a scrolling canvas, only the rows in view have widgets
+
+        A pool of buttons is recycled as the canvas scrolls, so widget count depends on window size, not roster size'''
+        self.canvas = canvas
+        self.names = [] # Active player names in display order
+        self.form = {} # key=name, value=(Streak, Longest, Form)
+        self.slots = [] # Recycled buttons, each [button, canvas item, player index or None, avatar]
+        self.columns = 0
+        self.rowHeight = 0
+        self.loader = Loader(self.canvas, data.executor)
+        self.layoutPasses = RateCounter() # Full layouts, see rate() for passes per second
+
+        self.version = self.data_version(data)
+        self.names = data.query.all_player_names(True)
+        self.form = data.query.all_player_form(True)
+        self.position()
 
-        self.generate(data)
-        self.position(self.root, data.config.settings['hide_sidebar'])
 
+    def data_version(self, data):
+        '''Returns a key that changes when players or records change, in this process or any other'''
+        return (data.version, data.query.data_version())
 
-    def add_icon(self, name):
-        '''Adds one icon to self.icons'''
-        useAvatar = False
 
-        if os.path.isfile(os.path.join('img', 'avatars', name +  '.png')):
-            avatar = tk.PhotoImage(master=self.root, file=os.path.join('img', 'avatars', name +  '.png'))
-            if avatar.width() == 100 and avatar.height() == 100: # Only accept 100x100px
-                self.avatars[name] = avatar
-                useAvatar = True
+    def label(self, name):
+        '''Returns button text, the player's name with their recent form underneath'''
+        if name in self.form and self.form[name][2]:
+            return '{}\n{}'.format(name, self.form[name][2])
+        return name
 
-        if useAvatar:
-            self.icons[name] = ttk.Button(self.root, text=name, image=self.avatars[name], compound=tk.TOP, width=10)
-        else:
-            self.icons[name] = ttk.Button(self.root, text=name, image=self.avatars['default'], compound=tk.TOP, width=10)
 
+    def new_slot(self):
+        '''Creates a hidden button for the pool'''
+        button = ttk.Button(self.canvas, image=avatars.default(), compound=tk.TOP, width=10)
+        item = self.canvas.create_window(0, 0, window=button, anchor='nw', state='hidden')
+        slot = [button, item, None, None]
+        self.slots.append(slot)
+
+        if not self.rowHeight: # Measure once with a two line label
+            button['text'] = 'Player\nWWWWW'
+            button.update_idletasks()
+            self.rowHeight = max(button.winfo_reqheight(), 100)
 
-    def remove_icon(self, name):
-        '''Removes a single icon'''
-        self.icons[name].destroy()
-        del self.icons[name]
+        return slot
 
 
-    def generate(self, data):
-        '''Generates initial player icon buttons'''
-        for name in data.query.all_player_names(True):
-            self.add_icon(name)
+    def fill_slot(self, slot, index):
+        '''Shows player number index in a slot, the avatar is loaded now that it is on screen'''
+        name = self.names[index]
+        row, col = divmod(index, self.columns)
+        slot[2] = index
+        slot[3] = avatars.get(name, (100, 100)) # Only accept 100x100px, the slot keeps the image alive
+        slot[0].configure(text=self.label(name), image=slot[3])
+        self.canvas.coords(slot[1], col * self.cellWidth, row * self.rowHeight)
+        self.canvas.itemconfigure(slot[1], state='normal')
 
 
-    def position(self, root, hideSidebar):
-        '''Repositions all player buttons - can get slow with large rosters'''
-        if len(self.icons) > 0:
-            width = root.winfo_width() // 110
-            if hideSidebar:
-                width += 1
+    def render(self):
+        '''Fills slots for the visible rows, recycling slots whose players scrolled out of view'''
+        try:
+            if not self.canvas.winfo_exists(): # Scheduled before the window closed
+                return
+        except tk.TclError:
+            return
+        if not self.columns or not self.rowHeight:
+            return
 
-            # Advance columns
-            col,row = 0,0
-            for icon in self.icons.values():
-                icon.grid(row=row, column=col)
-                col += 1
+        top = self.canvas.canvasy(0)
+        first = max(0, int(top // self.rowHeight) - self.overscan)
+        last = int((top + self.canvas.winfo_height()) // self.rowHeight) + self.overscan
+        wanted = set(range(first * self.columns, min(len(self.names), (last + 1) * self.columns)))
 
-                # Advance rows
-                if col >= width - 1:
-                    row += 1
-                    col = 0
+        free = []
+        for slot in self.slots:
+            if slot[2] in wanted:
+                wanted.discard(slot[2]) # Already showing
+            else:
+                free.append(slot)
 
+        for index in sorted(wanted):
+            self.fill_slot(free.pop() if free else self.new_slot(), index)
 
-    def trim(self, data):
-        '''Removes all player icon buttons not in data.players.all'''
-        iconCopy = self.icons.copy()
-        for name in iconCopy:
-            if name not in data.query.all_player_names(True):
-                self.remove_icon(name)
+        for slot in free: # Not needed at this scroll position
+            if slot[2] != None:
+                slot[2], slot[3] = None, None
+                self.canvas.itemconfigure(slot[1], state='hidden')
+
+
+    def position(self):
+        '''Recomputes the grid when the column count changes, otherwise only renders newly visible rows'''
+        columns = max(1, self.canvas.winfo_width() // self.cellWidth)
+        if columns != self.columns:
+            self.columns = columns
+            self.layout()
+        else:
+            self.render()
 
 
-    def append(self, data):
-        '''Adds all pending icons to self.icons from data.players.all'''
-        for name in data.query.all_player_names(True):
-            if name not in self.icons.keys():
-                self.add_icon(name)
+    def layout(self):
+        '''Resizes the scroll region and re-renders every slot for the current column count'''
+        if not self.rowHeight:
+            self.new_slot()
+
+        self.layoutPasses.tick()
+        rows = -(-len(self.names) // self.columns)
+        self.canvas.configure(scrollregion=(0, 0, self.columns * self.cellWidth, rows * self.rowHeight))
+        for slot in self.slots: # Positions are stale, render() shows the slots it reuses
+            slot[2], slot[3] = None, None
+            self.canvas.itemconfigure(slot[1], state='hidden')
+        self.render()
 
 
     def refresh(self, data):
-        '''Regenerates and repositions player icons'''
-        self.trim(data)
-        self.append(data)
-        self.position(self.root, data.config.settings['hide_sidebar'])
+        '''Reloads active players in the background and redraws what changed, nothing to do if the data has not changed'''
+        version = self.data_version(data)
+        if version == self.version:
+            return
+
+        self.version = version
+        self.loader.load('players', lambda q: (q.all_player_names(True), q.all_player_form(True)),
+            lambda result: self.apply(*result))
+
+
+    def apply(self, names, form):
+        '''Updates icons from a finished refresh, a full layout only runs if the roster changed'''
+        removed = set(self.names) - set(names)
+        changed = {n for n in names if form.get(n) != self.form.get(n)}
+        rosterChanged = names != self.names
+
+        self.names = names
+        self.form = form
+        for name in removed: # Free cached avatars of players no longer shown
+            avatars.drop(name)
+
+        if rosterChanged:
+            self.layout()
+        else: # Same players in the same places, only relabel visible icons whose form changed
+            for slot in self.slots:
+                if slot[2] != None and self.names[slot[2]] in changed:
+                    slot[0]['text'] = self.label(self.names[slot[2]])
 
 
 
@@ -121,7 +190,12 @@ class TopMenu:
         self.file = tk.Menu(self.top, tearoff=0)
         #self.file.add_command(label="Save", command=print)
         self.file.add_command(label="Refresh", command=lambda d=data: icons.refresh(d))
-        #self.file.add_command(label="Export", command=print)
+        self.file.add_command(label="Import...", command=lambda m=root,d=data: menus.importRecords.open(m,d,lambda: icons.refresh(d)))
+        self.export = tk.Menu(self.file, tearoff=0)
+        self.export.add_command(label="Match Records...", command=lambda m=root,d=data: menus.exportRecords.open(m,d,'records'))
+        self.export.add_command(label="Players...", command=lambda m=root,d=data: menus.exportRecords.open(m,d,'players'))
+        self.export.add_command(label="Games...", command=lambda m=root,d=data: menus.exportRecords.open(m,d,'games'))
+        self.file.add_cascade(label="Export", menu=self.export)
         self.file.add_separator()
         self.file.add_command(label="Exit", command=sys.exit)
         self.top.add_cascade(label="File", menu=self.file)
@@ -144,8 +218,12 @@ class TopMenu:
         self.arrange.add_radiobutton(label="Matches")
         self.arrange.add_radiobutton(label="Recent")
         self.view.add_command(label="Match Records", command=lambda m=root, d=data: menus.matchRecords.open(m,d))
+        self.view.add_command(label="Rivalries", command=lambda m=root, d=data: menus.rivalries.open(m,d))
         #self.view.add_cascade(label="Arrange", menu=self.arrange)
         self.view.add_command(label="Toggle Sidebar", command=lambda d=data: frames.toggle_sidebar(d))
+        if menus.debugPanel != None: # UI instrumentation enabled
+            self.view.add_separator()
+            self.view.add_command(label="Debug Panel", accelerator="F12", command=lambda m=root: menus.debugPanel.open(m))
         self.top.add_cascade(label="View", menu=self.view)
 
         self.help = tk.Menu(self.top, tearoff=0)
@@ -161,16 +239,22 @@ class Frames:
         self.mainFrame = tk.Frame(root)
         self.mainCanvas = tk.Canvas(self.mainFrame, bd=0, highlightthickness=0, bg='gray')
         self.scrollbar = tk.Scrollbar(self.mainFrame, orient="vertical", command=self.mainCanvas.yview)
-        self.scrollFrame = tk.Frame(self.mainCanvas, bg='gray')
         self.sideFrame = tk.Frame(root, width=110)
 
-        self.mainCanvas.create_window((0, 0), window=self.scrollFrame, anchor="nw")
-        self.mainCanvas.configure(yscrollcommand=self.scrollbar.set)
+        self.mainCanvas.configure(yscrollcommand=self.on_scroll)
+        self.scrollListeners = [] # Functions called after the canvas scrolls
 
         self.bind(root)
         self.position(data)
 
 
+    def on_scroll(self, first, last):
+        '''Updates the scrollbar and notifies scroll listeners'''
+        self.scrollbar.set(first, last)
+        for listener in self.scrollListeners:
+            self.mainCanvas.after_idle(listener)
+
+
     def mouse_wheel(self, event):
         '''Scrolls player widget on Linux and Windows'''
         self.mainCanvas.yview_scroll(int(-1*(event.delta/120)), "units")
@@ -178,13 +262,6 @@ class Frames:
 
     def bind(self, root):
         '''Binds scroll event'''
-        self.scrollFrame.bind(
-            "<Configure>",
-            lambda e: self.mainCanvas.configure(
-                scrollregion=self.mainCanvas.bbox("all")
-            )
-        )
-
         # Bind scroll for Windows
         root.bind("<MouseWheel>", self.mouse_wheel)
         # Bind scroll for Linux
@@ -227,18 +304,97 @@ class Menus:
         self.matchResults = MatchResults()
 
         self.matchRecords = MatchRecords()
+        self.rivalries = Rivalries()
+        self.importRecords = ImportRecords()
+        self.exportRecords = ExportRecords()
 
         self.about = About()
+        self.debugPanel = None # DebugPanel when UI instrumentation is enabled
+
+
+
+class DebugPanel:
+    refreshInterval = 500 # Milliseconds between panel updates
+
+    def __init__(self, window):
+        '''Live view of UI timings and event loop lag collected by Window.instrument'''
+        self.window = window
+        self.top = None
+
+
+    def open(self, root):
+        '''Opens the panel, or raises it if already open'''
+        if self.top != None and self.top.winfo_exists():
+            self.top.lift()
+            return
+
+        self.top = tk.Toplevel(root)
+        self.top.title("Debug Panel")
+
+        self.loopText = tk.Label(self.top, justify=tk.LEFT, anchor=tk.W, font="TkFixedFont")
+        self.tree = ttk.Treeview(self.top, columns=('count','last','mean','p95','max'), height=14)
+        self.tree.column('#0', width=240)
+        self.tree.heading('#0', text='Timing', anchor=tk.W)
+        for col, text in (('count','Count'), ('last','Last ms'), ('mean','Mean ms'), ('p95','p95 ms'), ('max','Max ms')):
+            self.tree.column(col, width=70, anchor=tk.E)
+            self.tree.heading(col, text=text, anchor=tk.E)
+
+        self.buttonFrame = tk.Frame(self.top)
+        self.save = tk.Button(self.buttonFrame, text="Save JSON...", command=self.save_json)
+        self.reset = tk.Button(self.buttonFrame, text="Reset", width=8, command=self.window.reset_metrics)
+        self.close = tk.Button(self.buttonFrame, text="Close", width=8, command=self.top.destroy)
+        self.top.bind('<Escape>', lambda x=0:self.close.invoke())
+
+        self.position()
+        self.update()
+
+
+    def update(self):
+        '''Refreshes the panel from the latest metrics while it is open'''
+        if self.top == None or not self.top.winfo_exists():
+            return
+
+        report = self.window.metrics_report()
+        loop = report['loop']
+        self.loopText['text'] = ('Event loop  lag mean {:.1f} ms  p95 {:.1f} ms  max {:.1f} ms  stalls {} (>= {} ms)\n'
+            'Layout      {:.1f} passes/s, {} total').format(loop['lag_mean_ms'], loop['lag_p95_ms'], loop['lag_max_ms'],
+            loop['stalls'], loop['stall_ms'], report['layout']['passes_per_second'], report['layout']['passes'])
+
+        self.tree.delete(*self.tree.get_children())
+        for name in sorted(report['timings']):
+            t = report['timings'][name]
+            self.tree.insert('', tk.END, text=name, values=[t['count'], t['last_ms'], t['mean_ms'], t['p95_ms'], t['max_ms']])
+
+        self.top.after(self.refreshInterval, self.update)
+
+
+    def save_json(self):
+        '''Prompts for a path and writes the full metrics report'''
+        path = filedialog.asksaveasfilename(parent=self.top, title="Save Metrics", defaultextension=".json",
+            initialfile="ui_metrics.json", filetypes=[("JSON", "*.json")])
+        if path:
+            self.window.dump_metrics(path)
+
+
+    def position(self):
+        '''Positions window elements'''
+        self.loopText.pack(side=tk.TOP, fill=tk.X, padx=6, pady=4)
+        self.tree.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.buttonFrame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.close.pack(side=tk.RIGHT, padx=4, pady=4)
+        self.reset.pack(side=tk.RIGHT, padx=4, pady=4)
+        self.save.pack(side=tk.LEFT, padx=4, pady=4)
 
 
 
 class Window:
+    resizeDelay = 40 # Milliseconds of quiet before a burst of resize events is laid out
+
     def __init__(self, data):
         '''Main UI object - contains all UI elements and root Tk window'''
         self.root = tk.Tk()
         self.root.title("GrudgeMatch")
         self.root.resizable(True, True)
-        self.root.bind('<Configure>', self.on_resize)
         self.root.minsize(565,390)
 
         self.data = data # Reference to data object
@@ -258,13 +414,96 @@ class Window:
             self.root.wm_iconphoto(True, *icons)
 
         self.frames = Frames(self.root, self.data)
-        self.icons = PlayerIcons(self.frames.scrollFrame, self.data)
+        self.icons = PlayerIcons(self.frames.mainCanvas, self.data)
+
+        self.timings = None # UI instrumentation, see instrument()
+        if self.data.config.settings.get('ui_metrics'):
+            self.instrument()
+
+        self.frames.scrollListeners.append(self.icons.render)
+
+        self.layoutJob = None # Pending debounced layout
+        self.layoutSize = None # (columns, height) of the canvas at the last layout
+        self.root.bind('<Configure>', self.on_resize)
 
         self.sidebar = Sidebar(self.frames.sideFrame, self.data, self.menus, self.icons)
         self.menu = TopMenu(self.root, self.data, self.menus, self.icons, self.frames)
         self.root.config(menu=self.menu.top)
 
+        # Optional JSON API for overlays, served from background threads
+        self.server = None
+        if self.data.config.settings.get('api_port'):
+            from src.server import ApiServer
+            self.server = ApiServer(self.data.path, port=self.data.config.settings['api_port'], events=self.data.events)
+            self.server.start()
+
+
+    def instrument(self):
+        '''Times window opens, tree builds and icon layout passes, and watches the event loop for stalls'''
+        self.timings = Timings()
+        self.loop = LoopMonitor(self.root)
+        self.loop.start()
+
+        idle = self.root.after_idle # Window opens are also timed until Tk has drawn them
+        for obj, method in ((self.menus.matchSetup, 'open'), (self.menus.matchRecords, 'open'),
+                (self.menus.manPlayers, 'open'), (self.menus.manGames, 'open')):
+            self.timings.wrap(obj, method, idle=idle)
+
+        for obj, method in ((self.menus.matchRecords, 'build_tree'), (self.menus.matchRecords, 'fill_folders'),
+                (self.menus.matchRecords, 'fill_page'), (self.menus.manPlayers, 'build_tree'),
+                (self.menus.manPlayers, 'fill_tree'), (self.menus.manGames, 'build_tree'),
+                (self.icons, 'layout'), (self.icons, 'render')):
+            self.timings.wrap(obj, method)
+
+        self.menus.debugPanel = DebugPanel(self)
+        self.root.bind('<F12>', lambda e: self.menus.debugPanel.open(self.root))
+
+
+    def metrics_report(self):
+        '''Returns UI timings, event loop lag and related cache counters as a dict'''
+        report = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'loop': self.loop.report(),
+            'timings': self.timings.report(),
+            'layout': {'passes': self.icons.layoutPasses.total, 'passes_per_second': self.icons.layoutPasses.rate(),
+                'slots': len(self.icons.slots), 'players': len(self.icons.names)},
+            'avatars': avatars.stats(),
+            'identities': self.data.identities.stats(),
+        }
+        if self.data.profiler != None:
+            report['queries'] = self.data.profiler.report()
+        return report
+
+
+    def dump_metrics(self, path):
+        '''Writes metrics_report() to a JSON file'''
+        with open(path, 'w', encoding='utf-8') as outFile:
+            json.dump(self.metrics_report(), outFile, indent=2)
+
+
+    def reset_metrics(self):
+        '''Clears collected timings and loop statistics'''
+        self.timings.reset()
+        self.loop.reset()
+
 
     def on_resize(self, event: tk.Event) -> None:
-        '''Updates positions on window resize'''
-        self.icons.position(self.root, self.data.config.settings['hide_sidebar'])
+        '''Schedules a layout when the window or player canvas changes size, coalescing bursts of events
+
+        The binding on root also receives every child widget's <Configure>, those are ignored'''
+        if event.widget is not self.root and event.widget is not self.frames.mainCanvas:
+            return
+
+        if self.layoutJob != None:
+            self.root.after_cancel(self.layoutJob)
+        self.layoutJob = self.root.after(self.resizeDelay, self.run_layout)
+
+
+    def run_layout(self):
+        '''Repositions player icons unless the canvas' column count and height are unchanged'''
+        self.layoutJob = None
+        canvas = self.frames.mainCanvas
+        size = (canvas.winfo_width() // PlayerIcons.cellWidth, canvas.winfo_height())
+        if size != self.layoutSize:
+            self.layoutSize = size
+            self.icons.position()
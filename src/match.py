@@ -1,6 +1,10 @@
 import tkinter as tk
 import tkinter.ttk as ttk
+import tkinter.filedialog as filedialog
 from src.message import *
+from src.transfer import MatchImporter, MatchExporter, export_matrix
+from src.worker import Loader
+from src.avatars import avatars
 import os, datetime
 
 
@@ -35,10 +39,7 @@ class MatchResults:
         '''Creates buttons for both players'''
         n = 0
         for p in [p1,p2]:
-            if os.path.isfile(os.path.join('img', 'avatars', p +  '.png')):
-                self.avatars.append(tk.PhotoImage(master=self.top, file=os.path.join('img', 'avatars', p +  '.png')))
-            else:
-                self.avatars.append(tk.PhotoImage(master=self.top, file=os.path.join('img', 'avatars',  'default.png')))
+            self.avatars.append(avatars.get(p))
 
             self.icons.append(tk.Button(self.top, text=p, image=self.avatars[-1], compound=tk.TOP, width=90))
             self.icons[-1]['command'] = lambda d=data,s=setup,p=p,n=n: self.set_winner(d,s,p,n)
@@ -284,29 +285,20 @@ class MatchSetup:
         '''Initial check if any selection is missing/inactive from db, returns list of tuples describing missing items'''
         missing, inactive = [], []
 
-        playerStatus = data.query.all_player_status()
-        gameStatus = data.query.all_game_status()
-
         # Check game
-        if self.game.get() in gameStatus.keys():
-            if not gameStatus[self.game.get()]:
-                inactive.append(('game', self.game.get()))
-        else:
+        status = data.identities.game_status(self.game.get())
+        if status == None:
             missing.append(('game', self.game.get()))
+        elif not status:
+            inactive.append(('game', self.game.get()))
 
-        # Check P1
-        if self.p1.get() in playerStatus.keys():
-            if not playerStatus[self.p1.get()]:
-                inactive.append(('player', self.p1.get()))
-        else:
-            missing.append(('player', self.p1.get()))
-
-        # Check P2
-        if self.p2.get() in playerStatus.keys():
-            if not playerStatus[self.p2.get()]:
-                inactive.append(('player', self.p2.get()))
-        else:
-            missing.append(('player', self.p2.get()))
+        # Check players
+        for name in (self.p1.get(), self.p2.get()):
+            status = data.identities.player_status(name)
+            if status == None:
+                missing.append(('player', name))
+            elif not status:
+                inactive.append(('player', name))
 
         return missing, inactive
 
@@ -354,29 +346,199 @@ class MatchSetup:
 
 
 
+class EditRecord:
+    def open(self, records, data):
+        '''Opens the Edit Match window for the record selected in the match records window'''
+        self.records = records
+        self.data = data
+        self.selected = records.get_selection()
+        if self.selected == None: # Row was unloaded since it was selected
+            return
+
+        self.top = tk.Toplevel(records.top)
+        self.top.title("Edit Match")
+        self.top.resizable(False,False)
+
+        self.text = tk.Label(self.top, text="Editing match #{}".format(self.selected['id']))
+        self.promptFrame = tk.Frame(self.top)
+
+        self.game = tk.StringVar(value=self.selected['game'])
+        self.p1 = tk.StringVar(value=self.selected['p1'])
+        self.p2 = tk.StringVar(value=self.selected['p2'])
+        self.win = tk.StringVar(value=self.selected['win'])
+        self.date = tk.StringVar(value=self.selected['date'])
+        self.p1.trace('w', self.refresh_winners)
+        self.p2.trace('w', self.refresh_winners)
+
+        players = data.query.all_player_names(True)
+        self.labelGame = tk.Label(self.promptFrame, text="Game:")
+        self.selectGame = ttk.Combobox(self.promptFrame, width=24, textvariable=self.game, values=sorted(data.query.all_game_names(True)))
+        self.labelP1 = tk.Label(self.promptFrame, text="Player 1:")
+        self.selectP1 = ttk.Combobox(self.promptFrame, width=24, textvariable=self.p1, values=players)
+        self.labelP2 = tk.Label(self.promptFrame, text="Player 2:")
+        self.selectP2 = ttk.Combobox(self.promptFrame, width=24, textvariable=self.p2, values=players)
+        self.labelWin = tk.Label(self.promptFrame, text="Winner:")
+        self.selectWin = ttk.Combobox(self.promptFrame, width=24, textvariable=self.win, state='readonly')
+        self.labelDate = tk.Label(self.promptFrame, text="Date:")
+        self.dateEntry = tk.Entry(self.promptFrame, textvar=self.date, width=26)
+        self.refresh_winners()
+
+        self.update = tk.Button(self.top, text="Update", width=8, command=self.action)
+        self.cancel = tk.Button(self.top, text="Cancel", width=8, command=self.top.destroy)
+
+        self.top.bind('<Return>', lambda x=0:self.update.invoke())
+        self.top.bind('<Escape>', lambda x=0:self.cancel.invoke())
+
+        self.position()
+        self.top.grab_set()
+
+
+    def position(self):
+        '''Positions window elements'''
+        self.text.pack(side=tk.TOP, pady=4)
+        self.promptFrame.pack(padx=4)
+
+        for row, (label, field) in enumerate([(self.labelGame, self.selectGame), (self.labelP1, self.selectP1),
+                (self.labelP2, self.selectP2), (self.labelWin, self.selectWin), (self.labelDate, self.dateEntry)]):
+            label.grid(row=row, column=1, padx=2, pady=2, sticky=tk.W)
+            field.grid(row=row, column=2, padx=2, pady=2)
+
+        self.update.pack(side=tk.LEFT, padx=4, pady=4)
+        self.cancel.pack(side=tk.RIGHT, padx=4, pady=4)
+
+
+    def refresh_winners(self, *args):
+        '''Limits the winner choices to the two selected players'''
+        players = [p for p in (self.p1.get(), self.p2.get()) if p != '']
+        self.selectWin['values'] = players
+        if self.win.get() not in players:
+            self.win.set('')
+
+
+    def validate(self, match):
+        '''Returns an error message for an invalid match, or None'''
+        if self.data.identities.game_status(match['game']) == None:
+            return "Unknown game: {}".format(match['game'])
+        for name in (match['p1'], match['p2']):
+            if self.data.identities.player_status(name) == None:
+                return "Unknown player: {}".format(name)
+
+        if match['p1'] == match['p2']:
+            return "Players must be different"
+        if match['win'] not in (match['p1'], match['p2']):
+            return "Winner must be one of the players"
+
+        if not self.data.validate_date(match['date']):
+            return "Date must be YYYY-MM-DD"
+        return None
+
+
+    def action(self):
+        '''Replaces the record with the entered match, for Update button press'''
+        match = {'game': self.game.get(), 'p1': self.p1.get(), 'p2': self.p2.get(), 'win': self.win.get(), 'date': self.date.get().strip()}
+        error = self.validate(match)
+        if error != None:
+            self.message = Failure(self.top, error)
+            return
+
+        self.data.edit_match(self.selected['id'], match)
+        self.records.refresh_games([self.selected['game'], match['game']])
+        self.top.destroy()
+
+
+
+class RemoveRecord:
+    def open(self, records, data):
+        '''Opens the Remove Match window for the record selected in the match records window'''
+        self.records = records
+        self.data = data
+        self.selected = records.get_selection()
+        if self.selected == None: # Row was unloaded since it was selected
+            return
+
+        self.top = tk.Toplevel(records.top)
+        self.top.title("Remove Match")
+        self.top.resizable(False,False)
+
+        self.text = tk.Label(self.top, text="Remove match: {} vs {}\n{}, {}?".format(
+            self.selected['p1'], self.selected['p2'], self.selected['game'], self.selected['date']))
+        self.remove = tk.Button(self.top, text="Remove", width=8, command=self.confirm)
+        self.cancel = tk.Button(self.top, text="Cancel", width=8, command=self.top.destroy)
+
+        self.top.bind('<Return>', lambda x=0:self.remove.invoke())
+        self.top.bind('<Escape>', lambda x=0:self.cancel.invoke())
+
+        self.position()
+        self.top.grab_set()
+
+
+    def position(self):
+        '''Positions window elements'''
+        self.text.pack(side=tk.TOP, padx=4, pady=4)
+        self.cancel.pack(side=tk.RIGHT, padx=4, pady=4)
+        self.remove.pack(side=tk.RIGHT, padx=4)
+
+
+    def confirm(self):
+        '''Adds additional confirm dialog to remove button'''
+        self.remove['text'] = 'Confirm?'
+        self.remove['command'] = self.action
+
+
+    def action(self):
+        '''Conducts the action of the "Remove" button'''
+        if self.data.match_ids(self.selected['id']) != None:
+            self.data.delete_match(self.selected['id'])
+            self.records.refresh_games([self.selected['game']])
+            self.message = Success(self.top, "Match removed")
+
+        else:
+            self.message = Failure(self.top, "Error removing match")
+
+
+
 class MatchRecords:
+    pageSize = 200 # Rows fetched per page when a folder is expanded or scrolled
+
+    def __init__(self):
+        '''Top-level window for browsing, editing and removing match records'''
+        self.edit = EditRecord()
+        self.remove = RemoveRecord()
+
+
     def open(self, root, data):
         '''Match records display window'''
         self.top = tk.Toplevel(root)
         self.top.title("Match Records")
 
+        self.data = data
+        self.pages = {} # Paging state for each folder, key=folder item
+        self.loader = Loader(self.top, data.executor)
+
         self.mainFrame = tk.Frame(self.top)
         self.tree = self.build_tree(self.mainFrame, data)
         self.scrollbar = ttk.Scrollbar(self.mainFrame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscrollcommand=self.scrollbar.set)
+        self.tree.configure(yscrollcommand=self.on_scroll)
+
+        self.tree.bind('<<TreeviewOpen>>', self.on_open)
+        self.tree.bind('<<TreeviewClose>>', self.on_close)
+        self.tree.bind('<<TreeviewSelect>>', self.check_selection)
 
         self.exit = tk.Button(self.top, width=8, text="Exit", command=self.top.destroy)
+        self.editButton = tk.Button(self.top, width=8, text="Edit", command=lambda d=data: self.edit.open(self, d))
+        self.remButton = tk.Button(self.top, width=8, text="Remove", command=lambda d=data: self.remove.open(self, d))
 
         self.position()
+        self.check_selection()
 
 
     def build_tree(self, root, data):
-        '''Builds treeview widget'''
+        '''Builds treeview widget with one collapsed folder per game, records are loaded on demand'''
         tree = ttk.Treeview(root)
-        tree['columns'] = ('d','p1','p2','w','g')
-        tree['displaycolumns'] = ('d','p1','p2','w')
+        tree['columns'] = ('d','p1','p2','w')
 
         tree.tag_configure('folder', background='light gray')
+        tree.tag_configure('more', foreground='gray')
         tree.tag_configure('0', background='#E8E8E8')
         tree.tag_configure('1', background='#DFDFDF')
 
@@ -385,28 +547,354 @@ class MatchRecords:
         tree.column('p1',width=100,minwidth=25)
         tree.column('p2',width=100,minwidth=25)
         tree.column('w',width=100,minwidth=25)
-        tree.column('g', width=200,minwidth=25)
 
         tree.heading('#0', text='Game', anchor=tk.W)
         tree.heading('d', text="Date",anchor=tk.W)
         tree.heading('p1', text="P1",anchor=tk.W)
         tree.heading('p2', text="P2",anchor=tk.W)
         tree.heading('w', text="Winner",anchor=tk.W)
-        tree.heading('g', text="Game",anchor=tk.W)
 
-        folders = {} # Holds folders for later match placement
+        self.load_folders(tree)
+        return tree
+
+
+    def load_folders(self, tree):
+        '''Lists one folder per game in the background, behind a loading row'''
+        loading = tree.insert('', tk.END, text='Loading...')
+        self.loader.load('folders', lambda q: q.match_folders(), lambda folders, t=tree: self.fill_folders(t, loading, folders))
+
+
+    def fill_folders(self, tree, loading, folders):
+        '''Replaces the loading row with one folder per game'''
+        tree.delete(loading)
+        for f in folders:
+            folder = tree.insert('', tk.END, text=f[1], tag='folder')
+            self.pages[folder] = {'game': f[0], 'after': None, 'count': 0, 'more': None}
+            self.reset_folder(tree, folder)
+
+
+    def reset_folder(self, tree, folder):
+        '''Clears loaded records from a folder, leaving a placeholder so it can be expanded'''
+        self.loader.cancel(folder) # Results for the old contents are stale
+        tree.delete(*tree.get_children(folder))
+        page = self.pages[folder]
+        page['after'] = None
+        page['count'] = 0
+        page['more'] = tree.insert(folder, tk.END, text='...', tag='more')
+
+
+    def load_page(self, folder):
+        '''Fetches the next page of records for a folder in the background, after the last record loaded'''
+        page = self.pages[folder]
+        if page['more'] == None or self.loader.loading(folder):
+            return
+
+        self.tree.item(page['more'], text='Loading...')
+        self.loader.load(folder, lambda q, game, after: q.match_records_page(game, after, self.pageSize),
+            lambda rows, f=folder: self.fill_page(f, rows), page['game'], page['after'])
+
+
+    def fill_page(self, folder, rows):
+        '''Adds a loaded page of records to a folder'''
+        page = self.pages[folder]
+        self.tree.item(page['more'], text='...')
+        for r in rows:
+            self.tree.insert(folder, tk.END, text=r[0], values=r[1:5], tag=str(page['count']%2))
+            page['count'] += 1
+
+        if len(rows) < self.pageSize: # Folder is complete
+            self.tree.delete(page['more'])
+            page['more'] = None
+        else:
+            page['after'] = (rows[-1][1], rows[-1][0])
+            self.tree.move(page['more'], folder, tk.END)
+
+
+    def refresh_games(self, games):
+        '''Reloads the folders of game names whose records changed, or every folder if a game has none yet'''
+        folders = {self.tree.item(f, 'text'): f for f in self.pages}
+        if any(g not in folders for g in games):
+            self.loader.cancel()
+            self.tree.delete(*self.tree.get_children())
+            self.pages = {}
+            self.load_folders(self.tree)
+        else:
+            for game in set(games):
+                self.reset_folder(self.tree, folders[game])
+                if self.tree.tk.getboolean(self.tree.item(folders[game], 'open')):
+                    self.load_page(folders[game])
+        self.check_selection()
+
+
+    def get_selection(self):
+        '''Returns the selected record as a match dict of names with its record id, or None if no record is selected'''
+        selected = self.tree.selection()
+        if len(selected) != 1:
+            return None
+
+        folder = self.tree.parent(selected[0])
+        if folder not in self.pages or selected[0] == self.pages[folder]['more']:
+            return None # Game folder or placeholder row
+
+        values = self.tree.set(selected[0]) # Strings as displayed, item() would turn numeric names into ints
+        return {'id': int(self.tree.item(selected[0], 'text')), 'game': self.tree.item(folder, 'text'),
+            'p1': values['p1'], 'p2': values['p2'], 'win': values['w'], 'date': values['d']}
+
+
+    def check_selection(self, *args):
+        '''Enables edit and remove buttons while a single record is selected'''
+        state = tk.NORMAL if self.get_selection() != None else tk.DISABLED
+        self.editButton['state'] = state
+        self.remButton['state'] = state
+
+
+    def on_open(self, *args):
+        '''Loads the first page of a folder when it is expanded'''
+        folder = self.tree.focus()
+        if folder in self.pages and self.pages[folder]['count'] == 0:
+            self.load_page(folder)
+
+
+    def on_close(self, *args):
+        '''Releases loaded records when a folder is collapsed'''
+        folder = self.tree.focus()
+        if folder in self.pages:
+            self.reset_folder(self.tree, folder)
+
+
+    def on_scroll(self, first, last):
+        '''Updates the scrollbar and loads more records once a placeholder scrolls into view'''
+        self.scrollbar.set(first, last)
+        self.top.after_idle(self.load_visible)
+
+
+    def load_visible(self):
+        '''Loads the next page for every open folder whose placeholder is visible'''
+        try:
+            if not self.tree.winfo_exists(): # Scheduled before the window closed
+                return
+        except tk.TclError:
+            return
+        for folder, page in self.pages.items():
+            if page['more'] != None and self.tree.tk.getboolean(self.tree.item(folder, 'open')) and self.tree.bbox(page['more']):
+                self.load_page(folder)
+
+
+    def position(self):
+        '''Positions window elements'''
+        self.mainFrame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.exit.pack(side=tk.RIGHT, padx=4, pady=4)
+        self.remButton.pack(side=tk.RIGHT, pady=4)
+        self.editButton.pack(side=tk.RIGHT, padx=4, pady=4)
+
+
+
+class ImportRecords:
+    def open(self, root, data, done=None):
+        '''Prompts for a CSV/JSONL file and imports its matches with a progress window'''
+        path = filedialog.askopenfilename(parent=root, title="Import Matches",
+            filetypes=[("Match files", "*.csv *.jsonl *.ndjson"), ("All files", "*.*")])
+        if not path:
+            return
+
+        self.importer = MatchImporter(data, path)
+        self.steps = self.importer.steps()
+        self.done = done
+        self.root = root
+
+        self.top = tk.Toplevel(root)
+        self.top.title("Import Matches")
+        self.top.resizable(False,False)
+        self.top.wm_attributes("-topmost", True)
+
+        self.text = tk.Label(self.top, text="Importing {}".format(os.path.basename(path)))
+        self.bar = ttk.Progressbar(self.top, length=260, maximum=1.0)
+        self.status = tk.Label(self.top, text="", font="-size 8")
+
+        self.position()
+        self.top.grab_set()
+        self.top.after(1, self.step)
+
+
+    def position(self):
+        '''Positions window elements'''
+        self.text.pack(padx=12, pady=4)
+        self.bar.pack(padx=12, pady=2)
+        self.status.pack(padx=12, pady=4)
+
+
+    def step(self):
+        '''Imports a single batch, then reschedules itself so the window stays responsive'''
+        try:
+            self.bar['value'] = next(self.steps)
+            self.status['text'] = self.importer.summary()
+            self.top.after(1, self.step)
+
+        except StopIteration:
+            self.bar['value'] = 1.0
+            self.message = Success(self.top, self.importer.summary())
+            if self.done != None:
+                self.done()
+
+        except Exception as e: # Unreadable file or failed write, earlier batches are already recorded
+            self.top.grab_release()
+            self.top.destroy()
+            self.message = Failure(self.root, 'Import stopped at row {}:\n{}\n\n{}'.format(
+                self.importer.current_row(), e, self.importer.summary()))
+            if self.done != None and self.importer.imported:
+                self.done()
+
+
+
+class ExportRecords:
+    def open(self, root, data, table):
+        '''Prompts for a destination and streams records, players or games to it with a progress window'''
+        path = filedialog.asksaveasfilename(parent=root, title="Export " + table.title(), initialfile=table + '.csv',
+            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("Columnar", "*.gmc")])
+        if not path:
+            return
+
+        self.exporter = MatchExporter(data, table, path)
+        self.steps = self.exporter.steps()
+        self.root = root
+
+        self.top = tk.Toplevel(root)
+        self.top.title("Export " + table.title())
+        self.top.resizable(False,False)
+        self.top.wm_attributes("-topmost", True)
+
+        self.text = tk.Label(self.top, text="Exporting to {}".format(os.path.basename(path)))
+        self.bar = ttk.Progressbar(self.top, length=260, mode='indeterminate')
+        self.status = tk.Label(self.top, text="", font="-size 8")
+
+        self.position()
+        self.top.grab_set()
+        self.top.after(1, self.step)
+
+
+    def position(self):
+        '''Positions window elements'''
+        self.text.pack(padx=12, pady=4)
+        self.bar.pack(padx=12, pady=2)
+        self.status.pack(padx=12, pady=4)
+
+
+    def step(self):
+        '''Writes a single chunk, then reschedules itself so the window stays responsive'''
+        try:
+            next(self.steps)
+            self.bar.step()
+            self.status['text'] = self.exporter.summary()
+            self.top.after(1, self.step)
+
+        except StopIteration:
+            self.message = Success(self.top, self.exporter.summary())
+
+        except Exception as e: # Unwritable path or full disk, the file is left incomplete
+            self.top.grab_release()
+            self.top.destroy()
+            self.message = Failure(self.root, 'Export failed:\n{}'.format(e))
+
+
+
+class Rivalries:
+    def open(self, root, data):
+        '''Head-to-head records for every pair of players in a game'''
+        self.top = tk.Toplevel(root)
+        self.top.title("Rivalries")
+        self.data = data
+
+        self.gameFrame = tk.Frame(self.top)
+        self.labelGame = tk.Label(self.gameFrame, text="Game:")
+        self.game = tk.StringVar()
+        self.selectGame = ttk.Combobox(self.gameFrame, width=30, textvariable=self.game, state='readonly')
+        self.folders = {} # key=name, value=id for games with records
         for f in data.query.match_folders():
-            folders[f[1]] = tree.insert('', -1, text=f[1], tag='folder')
+            self.folders[f[1]] = f[0]
+        self.selectGame['values'] = list(self.folders.keys())
+        self.game.trace('w', self.refresh_tree)
 
-        for r in data.query.match_records("%","%","%"): # TODO: FILTER HERE
-            tree.insert(folders[r[5]], -1, text=r[0], values=r[1:5], tag='1') #TODO: Fix row color tags
+        self.mainFrame = tk.Frame(self.top)
+        self.tree = self.build_tree(self.mainFrame)
+        self.scrollbar = ttk.Scrollbar(self.mainFrame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.scrollbar.set)
+
+        self.buttonFrame = tk.Frame(self.top)
+        self.export = tk.Button(self.buttonFrame, width=12, text="Export Matrix", state=tk.DISABLED, command=self.export_matrix)
+        self.exit = tk.Button(self.buttonFrame, width=8, text="Exit", command=self.top.destroy)
+
+        self.top.bind('<Escape>', lambda x=0:self.exit.invoke())
+
+        self.position()
+        if self.folders:
+            self.selectGame.current(0)
+
+
+    def build_tree(self, root):
+        '''Builds empty rivalry tree'''
+        tree = ttk.Treeview(root, show='headings')
+        tree['columns'] = ('p1','p2','record','matches','last')
+
+        tree.tag_configure('0', background='#E8E8E8')
+        tree.tag_configure('1', background='#DFDFDF')
+
+        tree.column('p1',width=100)
+        tree.column('p2',width=100)
+        tree.column('record',width=80)
+        tree.column('matches',width=80)
+        tree.column('last',width=80)
+
+        tree.heading('p1', text='P1', anchor=tk.W)
+        tree.heading('p2', text='P2', anchor=tk.W)
+        tree.heading('record', text='Record', anchor=tk.W)
+        tree.heading('matches', text='Matches', anchor=tk.W)
+        tree.heading('last', text='Last', anchor=tk.W)
 
         return tree
 
 
+    def refresh_tree(self, *args):
+        '''Fills the tree with rivalries for the selected game'''
+        self.tree.delete(*self.tree.get_children())
+        game = self.folders.get(self.game.get())
+        if game == None:
+            self.export['state'] = tk.DISABLED
+            return
+
+        c = 0
+        for r in self.data.query.rivalries(game):
+            self.tree.insert('', tk.END, values=[r[0], r[1], '{}-{}'.format(r[2], r[3]), r[2] + r[3], r[4]], tag=str(c%2))
+            c += 1
+
+        self.export['state'] = tk.NORMAL
+
+
+    def export_matrix(self):
+        '''Saves the full head-to-head matrix for the selected game as CSV'''
+        game = self.folders.get(self.game.get())
+        path = filedialog.asksaveasfilename(parent=self.top, title="Export Matrix", initialfile=self.game.get() + '.csv',
+            filetypes=[("CSV", "*.csv")])
+        if game != None and path:
+            try:
+                count = export_matrix(self.data, game, path)
+            except OSError as e:
+                self.message = Failure(self.top, 'Export failed:\n{}'.format(e))
+                return
+            self.message = Notice(self.top, '{0}x{0} matrix exported'.format(count))
+
+
     def position(self):
         '''Positions window elements'''
+        self.gameFrame.pack(side=tk.TOP, padx=4, pady=4, anchor=tk.W)
+        self.labelGame.pack(side=tk.LEFT)
+        self.selectGame.pack(side=tk.LEFT)
+
         self.mainFrame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.buttonFrame.pack(side=tk.BOTTOM, anchor=tk.E)
         self.exit.pack(side=tk.RIGHT, padx=4, pady=4)
+        self.export.pack(side=tk.RIGHT, pady=4)
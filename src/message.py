@@ -61,6 +61,30 @@ class Failure:
 
 
 
+class Notice:
+    def __init__(self, root, message):
+        '''An informational pop-up that does not close its root window upon closing'''
+        self.top = tk.Toplevel(root)
+        self.top.title("Notice")
+        self.top.resizable(False,False)
+        self.top.wm_attributes("-topmost", True)
+
+        self.text = tk.Label(self.top, text=message)
+        self.ok = tk.Button(self.top, text="Ok", width=6, command=self.top.destroy)
+
+        self.top.bind('<Return>', lambda x=0:self.ok.invoke())
+
+        self.position()
+        self.top.grab_set()
+
+
+    def position(self):
+        '''Positions text and ok button'''
+        self.text.pack(padx=12, pady=6)
+        self.ok.pack(pady=6)
+
+
+
 class About:
     def open(self, root):
         '''Opens the about window'''
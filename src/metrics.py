@@ -0,0 +1,139 @@
+import time
+from collections import deque
+
+
+class RateCounter:
+    def __init__(self, window=1.0):
+        '''Counts events and reports how many happened per second over the last window seconds'''
+        self.window = window
+        self.times = deque()
+        self.total = 0
+
+
+    def tick(self):
+        '''Records one event'''
+        self.total += 1
+        self.times.append(time.monotonic())
+
+
+    def rate(self):
+        '''Returns events per second over the window'''
+        cutoff = time.monotonic() - self.window
+        while self.times and self.times[0] < cutoff:
+            self.times.popleft()
+        return len(self.times) / self.window
+
+
+
+class Timings:
+    recentSize = 200 # Samples kept per name for percentiles
+
+    def __init__(self):
+        '''Named duration statistics, e.g. how long each window takes to open'''
+        self.stats = {} # key=name, value=dict of counters and recent samples
+
+
+    def add(self, name, ms):
+        '''Records one duration in milliseconds'''
+        stats = self.stats.get(name)
+        if stats == None:
+            stats = self.stats[name] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0, 'recent': deque(maxlen=self.recentSize)}
+        stats['count'] += 1
+        stats['total_ms'] += ms
+        stats['max_ms'] = max(stats['max_ms'], ms)
+        stats['last_ms'] = ms
+        stats['recent'].append(ms)
+
+
+    def wrap(self, obj, method, name=None, idle=None):
+        '''Replaces obj.method with a timed version recorded under name
+
+        idle, e.g. a widget's after_idle, also records the time until the event loop is next idle as "name (idle)"'''
+        func = getattr(obj, method)
+        name = name if name else '{}.{}'.format(type(obj).__name__, method)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, (time.perf_counter() - start) * 1000)
+                if idle != None:
+                    idle(lambda: self.add(name + ' (idle)', (time.perf_counter() - start) * 1000))
+
+        setattr(obj, method, timed)
+
+
+    def report(self):
+        '''Returns a dict of name -> count, last, mean, p95 and max milliseconds'''
+        report = {}
+        for name, stats in self.stats.items():
+            report[name] = {'count': stats['count'], 'last_ms': round(stats['last_ms'], 3),
+                'mean_ms': round(stats['total_ms'] / stats['count'], 3), 'p95_ms': round(percentile(stats['recent'], 95), 3),
+                'max_ms': round(stats['max_ms'], 3)}
+        return report
+
+
+    def reset(self):
+        '''Clears all statistics'''
+        self.stats = {}
+
+
+
+class LoopMonitor:
+    def __init__(self, widget, interval=50, stallMs=100):
+        '''Measures Tk event loop latency with a heartbeat scheduled every interval ms on widget
+
+        Lag is how late each beat ran, any beat at least stallMs late is counted as a stall'''
+        self.widget = widget
+        self.interval = interval
+        self.stallMs = stallMs
+        self.lags = deque(maxlen=1200) # About a minute of beats at the default interval
+        self.stalls = deque(maxlen=50) # (time, lag ms) of recent stalls
+        self.beats, self.stallCount, self.maxLag = 0, 0, 0.0
+        self.expected = None
+
+
+    def start(self):
+        '''Schedules the first heartbeat'''
+        self.expected = time.perf_counter() + self.interval / 1000
+        self.widget.after(self.interval, self.beat)
+
+
+    def beat(self):
+        '''Records how late this beat ran and schedules the next'''
+        now = time.perf_counter()
+        lag = max(0.0, (now - self.expected) * 1000)
+        self.beats += 1
+        self.lags.append(lag)
+        self.maxLag = max(self.maxLag, lag)
+        if lag >= self.stallMs:
+            self.stallCount += 1
+            self.stalls.append((time.strftime('%H:%M:%S'), round(lag, 1)))
+
+        self.expected = now + self.interval / 1000
+        self.widget.after(self.interval, self.beat)
+
+
+    def report(self):
+        '''Returns a dict of heartbeat lag statistics'''
+        lags = list(self.lags)
+        return {'interval_ms': self.interval, 'beats': self.beats,
+            'lag_mean_ms': round(sum(lags) / len(lags), 3) if lags else 0.0, 'lag_p95_ms': round(percentile(lags, 95), 3),
+            'lag_max_ms': round(self.maxLag, 3), 'stall_ms': self.stallMs, 'stalls': self.stallCount, 'recent_stalls': list(self.stalls)}
+
+
+    def reset(self):
+        '''Clears lag statistics'''
+        self.lags.clear()
+        self.stalls.clear()
+        self.beats, self.stallCount, self.maxLag = 0, 0, 0.0
+
+
+
+def percentile(values, pct):
+    '''Returns the pct percentile of values by nearest rank, 0 if empty'''
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(pct / 100 * len(values))) - 1))]
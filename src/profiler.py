@@ -0,0 +1,144 @@
+import os, sys, json, time, threading
+
+
+class QueryProfiler:
+    buckets = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000) # Histogram upper bounds in milliseconds, plus one overflow bucket
+
+    def __init__(self, slowMs=100, logPath=None):
+        '''Collects per-method latency histograms and query plans, appending statements over slowMs to logPath'''
+        self.slowMs = slowMs
+        self.logPath = logPath
+        self.methods = {} # key=Query method, value=dict of counters and histogram
+        self.plans = {} # key=sql, value=list of EXPLAIN QUERY PLAN details
+        self.lock = threading.Lock() # Worker threads share one profiler
+
+
+    def plan(self, conn, sql, args):
+        '''Returns the query plan for a statement, explained once per distinct sql'''
+        plan = self.plans.get(sql)
+        if plan == None:
+            try:
+                plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, args).fetchall()]
+            except Exception: # Pragmas and other statements that cannot be explained
+                plan = []
+            self.plans[sql] = plan
+        return plan
+
+
+    def record(self, method, sql, args, ms, rows, plan):
+        '''Adds one finished statement to the method's stats, logging it if slow'''
+        with self.lock:
+            stats = self.methods.get(method)
+            if stats == None:
+                stats = self.methods[method] = {'calls': 0, 'rows': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                    'histogram': [0] * (len(self.buckets) + 1)}
+
+            stats['calls'] += 1
+            stats['rows'] += rows
+            stats['total_ms'] += ms
+            stats['max_ms'] = max(stats['max_ms'], ms)
+            bucket = 0
+            while bucket < len(self.buckets) and ms > self.buckets[bucket]:
+                bucket += 1
+            stats['histogram'][bucket] += 1
+
+            if ms >= self.slowMs and self.logPath:
+                entry = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'method': method, 'ms': round(ms, 3), 'rows': rows,
+                    'sql': ' '.join(sql.split()), 'args': [a if isinstance(a, (int, float, str)) or a == None else str(a) for a in args],
+                    'plan': plan}
+                try:
+                    with open(self.logPath, 'a', encoding='utf-8') as logFile:
+                        logFile.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                except OSError:
+                    pass
+
+
+    def report(self):
+        '''Returns a dict of method -> stats with mean latency and labelled histogram buckets'''
+        labels = ['<={}ms'.format(b) for b in self.buckets] + ['>{}ms'.format(self.buckets[-1])]
+        with self.lock:
+            report = {}
+            for method, stats in self.methods.items():
+                report[method] = {
+                    'calls': stats['calls'],
+                    'rows': stats['rows'],
+                    'mean_ms': round(stats['total_ms'] / stats['calls'], 3),
+                    'max_ms': round(stats['max_ms'], 3),
+                    'total_ms': round(stats['total_ms'], 3),
+                    'histogram': dict(zip(labels, stats['histogram'])),
+                }
+        return report
+
+
+    def summary(self):
+        '''Returns the report as a text table, slowest total time first'''
+        lines = ['{:<24} {:>7} {:>9} {:>10} {:>10} {:>11}'.format('Method', 'Calls', 'Rows', 'Mean ms', 'Max ms', 'Total ms')]
+        report = self.report()
+        for method in sorted(report, key=lambda m: -report[m]['total_ms']):
+            r = report[method]
+            lines.append('{:<24} {:>7} {:>9} {:>10.3f} {:>10.3f} {:>11.3f}'.format(method, r['calls'], r['rows'], r['mean_ms'], r['max_ms'], r['total_ms']))
+        return '\n'.join(lines)
+
+
+
+class ProfiledCursor:
+    def __init__(self, cursor, profiler):
+        '''Wraps a sqlite3 cursor, timing each statement from execute until its rows are fetched
+
+        Statements are attributed to the Query method that called execute'''
+        self.cursor = cursor
+        self.profiler = profiler
+        self.pending = None # [method, sql, args, ms, rows, plan] for the statement being read
+
+
+    def execute(self, sql, args=()):
+        '''Runs a statement, recording the previous one if its rows were never fetched'''
+        self.finish()
+        method = sys._getframe(1).f_code.co_name
+        plan = self.profiler.plan(self.cursor.connection, sql, args)
+
+        start = time.perf_counter()
+        self.cursor.execute(sql, args)
+        self.pending = [method, sql, args, (time.perf_counter() - start) * 1000, 0, plan]
+        return self
+
+
+    def fetch(self, func, *args):
+        '''Times a fetch call and adds it to the pending statement'''
+        start = time.perf_counter()
+        rows = func(*args)
+        if self.pending != None:
+            self.pending[3] += (time.perf_counter() - start) * 1000
+            self.pending[4] += len(rows) if isinstance(rows, list) else int(rows != None)
+        return rows
+
+
+    def fetchall(self):
+        rows = self.fetch(self.cursor.fetchall)
+        self.finish()
+        return rows
+
+
+    def fetchone(self):
+        row = self.fetch(self.cursor.fetchone)
+        self.finish()
+        return row
+
+
+    def fetchmany(self, size=None):
+        return self.fetch(self.cursor.fetchmany, size if size != None else self.cursor.arraysize)
+
+
+    def finish(self):
+        '''Records the pending statement'''
+        if self.pending != None:
+            self.profiler.record(*self.pending)
+            self.pending = None
+
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
@@ -0,0 +1,344 @@
+import math
+
+np = None # NumPy, imported on first use by load_numpy
+
+
+def load_numpy():
+    '''Imports NumPy on first use so it does not slow startup, returns None if it is not installed'''
+    global np
+    if np == None:
+        try:
+            import numpy
+            np = numpy
+        except ImportError: # Optional, Glicko2 falls back to pure Python
+            pass
+
+    return np
+
+
+def chronological(conn, game=None):
+    '''Yields (RecordId, GameId, Player1Id, Player2Id, WinnerId, Date) ordered by date, for one game id or all'''
+    cursor = conn.cursor()
+    if game == None:
+        cursor.execute('SELECT Id, GameId, Player1Id, Player2Id, WinnerId, Date FROM MatchRecords ORDER BY Date, Id')
+    else:
+        cursor.execute('SELECT Id, GameId, Player1Id, Player2Id, WinnerId, Date FROM MatchRecords WHERE GameId = ? ORDER BY Date, Id', (game,))
+
+    rows = cursor.fetchmany(10000)
+    while rows:
+        yield from rows
+        rows = cursor.fetchmany(10000)
+    cursor.close()
+
+
+
+class Elo:
+    migration = 3 # Schema version that creates the Ratings table
+    initial = 1500.0 # Rating for a player's first match in a game
+    k = 32.0 # Maximum rating change per match
+    scale = 400.0 # Rating difference for 10:1 expected odds
+
+    def __init__(self, conn):
+        '''Elo ratings per player per game, stored in the Ratings table'''
+        self.db = conn
+        self.c = conn.cursor()
+
+
+    def expected(self, ratingA, ratingB):
+        '''Returns the expected score of A against B'''
+        return 1.0 / (1.0 + 10.0 ** ((ratingB - ratingA) / self.scale))
+
+
+    def play(self, ratings, counts, game, p1, p2, winner):
+        '''Updates ratings and counts dicts, key=(player, game), for one match, returns the change for p1'''
+        k1, k2 = (p1, game), (p2, game)
+        r1 = ratings.get(k1, self.initial)
+        r2 = ratings.get(k2, self.initial)
+
+        delta = self.k * ((1.0 if winner == p1 else 0.0) - self.expected(r1, r2))
+        ratings[k1] = r1 + delta
+        ratings[k2] = r2 - delta
+        counts[k1] = counts.get(k1, 0) + 1
+        counts[k2] = counts.get(k2, 0) + 1
+
+        return delta
+
+
+    def load(self, keys):
+        '''Returns ratings and counts dicts for the given (player, game) keys'''
+        ratings, counts = {}, {}
+        for key in set(keys):
+            self.c.execute('SELECT Rating, Matches FROM Ratings WHERE PlayerId = ? AND GameId = ?', key)
+            row = self.c.fetchone()
+            if row != None:
+                ratings[key], counts[key] = row
+
+        return ratings, counts
+
+
+    def save(self, ratings, counts):
+        '''Writes ratings and counts dicts to the Ratings table, does not commit'''
+        self.c.executemany('INSERT OR REPLACE INTO Ratings (PlayerId, GameId, Rating, Matches) VALUES (?,?,?,?)',
+            [(key[0], key[1], ratings[key], counts[key]) for key in ratings])
+
+
+    def apply(self, records):
+        '''Applies converted match records, in order, on top of the stored ratings - does not commit'''
+        keys = []
+        for r in records:
+            keys += [(r['p1'], r['game']), (r['p2'], r['game'])]
+
+        ratings, counts = self.load(keys)
+        for r in records:
+            self.play(ratings, counts, r['game'], r['p1'], r['p2'], r['win'])
+
+        self.save(ratings, counts)
+
+
+    def replay(self, game=None):
+        '''Yields (RecordId, GameId, Player1Id, Player2Id, WinnerId) in chronological order, for one game id or all'''
+        for row in chronological(self.db, game):
+            yield row[:5]
+
+
+    def history(self, game=None):
+        '''Yields (RecordId, Player1 rating, Player2 rating) after each match, recomputed from scratch'''
+        ratings, counts = {}, {}
+        for recordId, g, p1, p2, winner in self.replay(game):
+            self.play(ratings, counts, g, p1, p2, winner)
+            yield recordId, ratings[(p1, g)], ratings[(p2, g)]
+
+
+    def rebuild(self, game=None):
+        '''Recalculates ratings from every match in one chronological pass, for one game id or all - does not commit'''
+        ratings, counts = {}, {}
+        for recordId, g, p1, p2, winner in self.replay(game):
+            self.play(ratings, counts, g, p1, p2, winner)
+
+        if game == None:
+            self.c.execute('DELETE FROM Ratings')
+        else:
+            self.c.execute('DELETE FROM Ratings WHERE GameId = ?', (game,))
+
+        self.save(ratings, counts)
+
+
+
+class Glicko2:
+    migration = 4 # Schema version that creates the Glicko table
+    staleMigration = 7 # Schema version that creates the GlickoStale table
+    initial = 1500.0 # Starting rating
+    deviation = 350.0 # Starting rating deviation
+    volatility = 0.06 # Starting volatility
+    tau = 0.5 # Constrains volatility change between periods
+    epsilon = 0.000001 # Convergence tolerance for the volatility iteration
+    scale = 173.7178 # Conversion between Glicko and Glicko-2 scales
+    periods = {'day': 10, 'month': 7, 'year': 4} # Length of the date prefix that identifies a period
+
+    def __init__(self, conn, period='month', useNumpy=True):
+        '''Glicko-2 ratings per player per game, recalculated in rating periods and stored in the Glicko table'''
+        self.db = conn
+        self.c = conn.cursor()
+        self.period = period
+        self.useNumpy = useNumpy
+
+
+    def mark_stale(self, games):
+        '''Flags game ids whose ratings must be replayed, as a whole period changes with each match - does not commit'''
+        self.c.executemany('INSERT OR IGNORE INTO GlickoStale (GameId) VALUES (?)', [(g,) for g in set(games)])
+
+
+    def stale_games(self):
+        '''Returns a list of game ids flagged by mark_stale'''
+        self.c.execute('SELECT GameId FROM GlickoStale')
+        return [row[0] for row in self.c.fetchall()]
+
+
+    def refresh(self):
+        '''Rebuilds every stale game, returns the game ids rebuilt - does not commit'''
+        games = self.stale_games()
+        for game in games:
+            self.rebuild(game)
+        return games
+
+
+    def rating_periods(self, game=None):
+        '''Yields lists of (GameId, Player1Id, Player2Id, WinnerId) for each period in chronological order'''
+        length = self.periods[self.period]
+        current, matches = None, []
+
+        for recordId, g, p1, p2, winner, date in chronological(self.db, game):
+            key = str(date)[:length]
+            if key != current and matches:
+                yield matches
+                matches = []
+            current = key
+            matches.append((g, p1, p2, winner))
+
+        if matches:
+            yield matches
+
+
+    def rebuild(self, game=None):
+        '''Recalculates ratings from every match, for one game id or all - does not commit
+
+        Games are replayed separately so a player's deviation only grows over periods their game was played'''
+        if game == None:
+            self.c.execute('DELETE FROM Glicko')
+            self.c.execute('DELETE FROM GlickoStale')
+            self.c.execute('SELECT DISTINCT GameId FROM MatchRecords')
+            games = [row[0] for row in self.c.fetchall()]
+        else:
+            self.c.execute('DELETE FROM Glicko WHERE GameId = ?', (game,))
+            self.c.execute('DELETE FROM GlickoStale WHERE GameId = ?', (game,))
+            games = [game]
+
+        for g in games:
+            self.c.executemany('INSERT INTO Glicko (PlayerId, GameId, Rating, Deviation, Volatility) VALUES (?,?,?,?,?)', self.ratings(g))
+
+
+    def ratings(self, game):
+        '''Returns (PlayerId, GameId, Rating, Deviation, Volatility) for one game id, one rating period at a time'''
+        keys = {} # key=(player, game), value=index into rating arrays
+        useNumpy = self.useNumpy and load_numpy() != None
+        mu, phi, sigma = [], [], []
+        if useNumpy:
+            mu, phi, sigma = np.zeros(0), np.zeros(0), np.zeros(0)
+
+        for matches in self.rating_periods(game):
+            a, b, s, new = [], [], [], 0
+            for g, p1, p2, winner in matches:
+                for key in ((p1, g), (p2, g)):
+                    if key not in keys:
+                        keys[key] = len(keys)
+                        new += 1
+                a.append(keys[(p1, g)])
+                b.append(keys[(p2, g)])
+                s.append(1.0 if winner == p1 else 0.0)
+
+            # New players start on the Glicko-2 scale
+            start = [0.0, self.deviation / self.scale, self.volatility]
+            if useNumpy:
+                mu = np.concatenate((mu, np.full(new, start[0])))
+                phi = np.concatenate((phi, np.full(new, start[1])))
+                sigma = np.concatenate((sigma, np.full(new, start[2])))
+                mu, phi, sigma = self.period_numpy(mu, phi, sigma, np.array(a), np.array(b), np.array(s))
+            else:
+                mu += [start[0]] * new
+                phi += [start[1]] * new
+                sigma += [start[2]] * new
+                mu, phi, sigma = self.period_python(mu, phi, sigma, a, b, s)
+
+        return [(key[0], key[1], float(mu[i]) * self.scale + self.initial, float(phi[i]) * self.scale, float(sigma[i]))
+            for key, i in keys.items()]
+
+
+    def period_numpy(self, mu, phi, sigma, a, b, s):
+        '''Updates every player at once for one period of matches a[n] vs b[n] with p1 scores s[n], returns (mu, phi, sigma)'''
+        n = len(mu)
+        i = np.concatenate((a, b)) # Each match seen from both sides
+        j = np.concatenate((b, a))
+        score = np.concatenate((s, 1.0 - s))
+
+        g = 1.0 / np.sqrt(1.0 + 3.0 * phi[j] ** 2 / math.pi ** 2)
+        e = 1.0 / (1.0 + np.exp(-g * (mu[i] - mu[j])))
+        vInv = np.bincount(i, g * g * e * (1.0 - e), n)
+        total = np.bincount(i, g * (score - e), n)
+
+        played = vInv > 0
+        newSigma = sigma.copy()
+        v = 1.0 / vInv[played]
+        newSigma[played] = self.volatility_numpy(phi[played], sigma[played], v, v * total[played])
+
+        newPhi = np.sqrt(phi ** 2 + newSigma ** 2) # Unplayed players only gain deviation
+        newPhi[played] = 1.0 / np.sqrt(1.0 / newPhi[played] ** 2 + vInv[played])
+
+        return mu + newPhi ** 2 * total, newPhi, newSigma
+
+
+    def volatility_numpy(self, phi, sigma, v, delta):
+        '''Solves for new volatilities with the Illinois algorithm, iterating all players together'''
+        alpha = np.log(sigma ** 2)
+        d2, p2, tau2 = delta ** 2, phi ** 2, self.tau ** 2
+
+        def f(x):
+            ex = np.exp(x)
+            return ex * (d2 - p2 - v - ex) / (2.0 * (p2 + v + ex) ** 2) - (x - alpha) / tau2
+
+        A = alpha.copy()
+        big = d2 > p2 + v
+        B = np.where(big, np.log(np.where(big, d2 - p2 - v, 1.0)), alpha - self.tau)
+        low = ~big & (f(B) < 0)
+        while low.any():
+            B = np.where(low, B - self.tau, B)
+            low = low & (f(B) < 0)
+
+        fA, fB = f(A), f(B)
+        active = np.abs(B - A) > self.epsilon
+        while active.any():
+            with np.errstate(divide='ignore', invalid='ignore'):
+                C = np.where(active, A + (A - B) * fA / (fB - fA), A)
+            fC = f(C)
+            swap = active & (fC * fB <= 0)
+            A = np.where(swap, B, A)
+            fA = np.where(swap, fB, np.where(active, fA / 2.0, fA))
+            B = np.where(active, C, B)
+            fB = np.where(active, fC, fB)
+            active = active & (np.abs(B - A) > self.epsilon)
+
+        return np.exp(A / 2.0)
+
+
+    def period_python(self, mu, phi, sigma, a, b, s):
+        '''Pure Python equivalent of period_numpy, returns new (mu, phi, sigma) lists'''
+        n = len(mu)
+        vInv, total = [0.0] * n, [0.0] * n
+
+        for p, o, score in zip(a + b, b + a, s + [1.0 - x for x in s]):
+            g = 1.0 / math.sqrt(1.0 + 3.0 * phi[o] ** 2 / math.pi ** 2)
+            e = 1.0 / (1.0 + math.exp(-g * (mu[p] - mu[o])))
+            vInv[p] += g * g * e * (1.0 - e)
+            total[p] += g * (score - e)
+
+        newMu, newPhi, newSigma = list(mu), [], list(sigma)
+        for p in range(n):
+            if vInv[p] > 0:
+                v = 1.0 / vInv[p]
+                newSigma[p] = self.volatility_python(phi[p], sigma[p], v, v * total[p])
+                phiStar = math.sqrt(phi[p] ** 2 + newSigma[p] ** 2)
+                newPhi.append(1.0 / math.sqrt(1.0 / phiStar ** 2 + vInv[p]))
+                newMu[p] = mu[p] + newPhi[p] ** 2 * total[p]
+            else: # Unplayed players only gain deviation
+                newPhi.append(math.sqrt(phi[p] ** 2 + sigma[p] ** 2))
+
+        return newMu, newPhi, newSigma
+
+
+    def volatility_python(self, phi, sigma, v, delta):
+        '''Solves for one new volatility with the Illinois algorithm'''
+        alpha = math.log(sigma ** 2)
+        d2, p2, tau2 = delta ** 2, phi ** 2, self.tau ** 2
+
+        def f(x):
+            ex = math.exp(x)
+            return ex * (d2 - p2 - v - ex) / (2.0 * (p2 + v + ex) ** 2) - (x - alpha) / tau2
+
+        A = alpha
+        if d2 > p2 + v:
+            B = math.log(d2 - p2 - v)
+        else:
+            B = alpha - self.tau
+            while f(B) < 0:
+                B -= self.tau
+
+        fA, fB = f(A), f(B)
+        while abs(B - A) > self.epsilon:
+            C = A + (A - B) * fA / (fB - fA)
+            fC = f(C)
+            if fC * fB <= 0:
+                A, fA = B, fB
+            else:
+                fA = fA / 2.0
+            B, fB = C, fC
+
+        return math.exp(A / 2.0)
@@ -0,0 +1,285 @@
+# server.py - Local HTTP/JSON API for live scoreboards and stream overlays
+# Run from the GrudgeMatch directory: python -m src.cli serve
+
+import os, json, queue, sqlite3, threading, hashlib, time
+from urllib.request import pathname2url
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from src.data import Query
+
+
+class ReadPool:
+    def __init__(self, path, size=4):
+        '''Fixed pool of read-only connections shared by request threads'''
+        self.path = path
+        self.pool = queue.Queue()
+        for _ in range(size):
+            self.pool.put(self.connect())
+
+        self.watcher = self.connect() # Only used for PRAGMA data_version
+        self.lock = threading.Lock()
+
+
+    def connect(self):
+        '''Opens a read-only connection usable from any thread'''
+        uri = 'file:{}?mode=ro'.format(pathname2url(os.path.abspath(self.path)))
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+
+    def run(self, func):
+        '''Calls func(query) with a pooled connection and returns its result'''
+        conn = self.pool.get()
+        try:
+            cursor = conn.cursor()
+            try:
+                return func(Query(conn, cursor))
+            finally:
+                cursor.close()
+        finally:
+            self.pool.put(conn)
+
+
+    def version(self):
+        '''Returns a value that changes whenever another connection commits to the database'''
+        with self.lock:
+            return self.watcher.execute('PRAGMA data_version;').fetchone()[0]
+
+
+    def close(self):
+        '''Closes every pooled connection'''
+        while not self.pool.empty():
+            self.pool.get().close()
+        self.watcher.close()
+
+
+
+def records_json(rows):
+    '''Formats (RecordId, Date, Player1, Player2, Winner, Game) rows as dicts'''
+    return [{'id': r[0], 'date': r[1], 'p1': r[2], 'p2': r[3], 'winner': r[4], 'game': r[5]} for r in rows]
+
+
+def get_players(query, params):
+    '''All active players, or every player with all=1'''
+    active = params.get('all') != '1'
+    return [{'id': p[0], 'name': p[1], 'wins': p[2], 'matches': p[3], 'last': p[4], 'elo': p[5], 'streak': p[6], 'form': p[7]}
+        for p in query.all_player_details(active)]
+
+
+def get_games(query, params):
+    '''All active games, or every game with all=1'''
+    active = params.get('all') != '1'
+    return [{'id': g[0], 'name': g[1], 'matches': g[2], 'last': g[3]} for g in query.all_game_details(active)]
+
+
+def get_records(query, params):
+    '''Newest records filtered by player, opponent, game, winner, since and until names/dates'''
+    filters = {'start': params.get('since'), 'end': params.get('until')}
+    for key, param, lookup in (('p1', 'player', query.player_id), ('p2', 'opponent', query.player_id),
+            ('winner', 'winner', query.player_id), ('game', 'game', query.game_id)):
+        if param in params:
+            filters[key] = lookup(params[param])
+            if filters[key] == None:
+                raise LookupError('Unknown {}: {}'.format(param, params[param]))
+
+    try:
+        limit = max(1, min(int(params.get('limit', 20)), 1000))
+    except ValueError:
+        raise ValueError('Invalid limit: {}'.format(params['limit']))
+    return records_json(query.recent_records(limit, **filters))
+
+
+def get_h2h(query, params):
+    '''Head-to-head record between p1 and p2 in each game'''
+    p1, p2 = query.player_id(params.get('p1')), query.player_id(params.get('p2'))
+    if p1 == None or p2 == None:
+        raise LookupError('Unknown player')
+    return [{'game': r[0], 'p1Wins': r[1], 'p2Wins': r[2], 'last': r[3]} for r in query.head_to_head(p1, p2)]
+
+
+def get_standings(query, params):
+    '''Elo standings for one game'''
+    game = query.game_id(params.get('game'))
+    if game == None:
+        raise LookupError('Unknown game')
+    return [{'name': r[0], 'elo': r[1], 'wins': r[2], 'matches': r[3]} for r in query.game_standings(game)]
+
+
+def get_glicko(query, params):
+    '''Glicko-2 ratings for one game, stale is true until a writer runs Data.refresh_glicko'''
+    game = query.game_id(params.get('game'))
+    if game == None:
+        raise LookupError('Unknown game')
+    return {'stale': query.glicko_stale(game), 'ratings': [{'name': r[0], 'rating': r[1], 'deviation': r[2], 'volatility': r[3]}
+        for r in query.glicko_standings(game)]}
+
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    routes = {
+        '/players': get_players,
+        '/games': get_games,
+        '/records': get_records,
+        '/h2h': get_h2h,
+        '/standings': get_standings,
+        '/glicko': get_glicko,
+    }
+
+    keepalive = 15.0 # Seconds between comment lines on idle event streams
+    pollInterval = 0.25 # Seconds between change checks when there is no in-process event bus
+    batchSize = 500 # Records sent per query while catching up
+
+    def do_GET(self):
+        '''Serves a route as JSON, answering 304 when the client's ETag is still current'''
+        url = urlsplit(self.path)
+        params = {}
+        for key, values in parse_qs(url.query).items():
+            params[key] = values[-1]
+
+        if url.path.rstrip('/') == '/events':
+            return self.stream_events(params)
+
+        route = self.routes.get(url.path.rstrip('/'))
+        if route == None:
+            return self.send_json(404, {'error': 'Unknown endpoint', 'endpoints': sorted(list(self.routes) + ['/events'])})
+
+        try:
+            etag, body = self.server.cached(self.path, lambda q: route(q, params))
+        except (LookupError, ValueError) as e:
+            return self.send_json(400, {'error': str(e)})
+
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_body(200, body, etag)
+
+
+    def stream_events(self, params):
+        '''Streams newly recorded matches as server-sent events, id: is the record id
+
+        Clients resume from ?after=<id> or the Last-Event-ID header, otherwise only new matches are sent'''
+        after = params.get('after', self.headers.get('Last-Event-ID'))
+        try:
+            cursor = int(after) if after != None else self.server.pool.run(lambda q: q.last_record_id())
+        except ValueError:
+            return self.send_json(400, {'error': 'Invalid cursor'})
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+
+        events = self.server.events.subscribe() if self.server.events != None else None
+        try:
+            while not self.server.closing:
+                rows = self.server.pool.run(lambda q: q.records_after(cursor, self.batchSize))
+                for record in records_json(rows):
+                    self.wfile.write('id: {}\nevent: match\ndata: {}\n\n'.format(record['id'], json.dumps(record)).encode('utf-8'))
+                    cursor = record['id']
+                self.wfile.flush()
+
+                if len(rows) < self.batchSize and not self.wait_for_change(events):
+                    self.wfile.write(b': keepalive\n\n')
+                    self.wfile.flush()
+
+        except (BrokenPipeError, ConnectionResetError): # Client went away
+            pass
+        finally:
+            if events != None:
+                self.server.events.unsubscribe(events)
+
+
+    def wait_for_change(self, events):
+        '''Blocks until a match is published or the database changes, returns False on keepalive timeout
+
+        The version is polled even with an event bus, which only sees matches recorded in this process'''
+        version = self.server.pool.version()
+        deadline = time.monotonic() + self.keepalive
+        while time.monotonic() < deadline and not self.server.closing:
+            if events != None:
+                try:
+                    events.get(timeout=self.pollInterval)
+                    while not events.empty(): # Coalesce bursts, the cursor query picks up every row
+                        events.get_nowait()
+                    return True
+                except queue.Empty:
+                    pass
+            else:
+                time.sleep(self.pollInterval)
+
+            if self.server.pool.version() != version:
+                return True
+        return False
+
+
+    def send_json(self, status, value):
+        '''Sends an uncached JSON response'''
+        self.send_body(status, json.dumps(value).encode('utf-8'), None)
+
+
+    def send_body(self, status, body, etag):
+        '''Sends a JSON body with caching headers'''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        if etag != None:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        '''Silences per-request logging, overlays poll constantly'''
+        pass
+
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, dbPath, host='127.0.0.1', port=8765, poolSize=4, events=None):
+        '''HTTP server exposing read-only Query results, cached until the database changes
+
+        Pass Data.events to push matches recorded in this process to /events immediately'''
+        super().__init__((host, port), ApiHandler)
+        self.pool = ReadPool(dbPath, poolSize)
+        self.events = events
+        self.closing = False
+        self.cache = {} # key=request path, value=(db version, etag, body)
+        self.lock = threading.Lock()
+
+
+    def cached(self, key, func):
+        '''Returns (etag, body) for key, only running func(query) if the database changed since it was cached'''
+        version = self.pool.version()
+        with self.lock:
+            entry = self.cache.get(key)
+        if entry != None and entry[0] == version:
+            return entry[1], entry[2]
+
+        body = json.dumps(self.pool.run(func)).encode('utf-8')
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest()[:16])
+        with self.lock:
+            if len(self.cache) > 1000: # Drop everything rather than grow without bound
+                self.cache.clear()
+            self.cache[key] = (version, etag, body)
+
+        return etag, body
+
+
+    def start(self):
+        '''Serves requests from a daemon thread, returns the thread'''
+        thread = threading.Thread(target=self.serve_forever, name='GrudgeMatchApi', daemon=True)
+        thread.start()
+        return thread
+
+
+    def server_close(self):
+        self.closing = True
+        super().server_close()
+        self.pool.close()
@@ -0,0 +1,39 @@
+----------------------------
+-- Migration 1: summary stat tables
+-----------------------------
+
+--Create per-player stats table, maintained by Data.record_match
+CREATE TABLE IF NOT EXISTS "PlayerStats" (
+	"PlayerId" INTEGER NOT NULL PRIMARY KEY,
+	"Wins" INTEGER NOT NULL DEFAULT 0,
+	"Matches" INTEGER NOT NULL DEFAULT 0,
+	"LastMatch" DATETIME,
+	FOREIGN KEY("PlayerId") REFERENCES "Players"("Id")
+);
+
+
+--Create per-game stats table, maintained by Data.record_match
+CREATE TABLE IF NOT EXISTS "GameStats" (
+	"GameId" INTEGER NOT NULL PRIMARY KEY,
+	"Matches" INTEGER NOT NULL DEFAULT 0,
+	"LastMatch" DATETIME,
+	FOREIGN KEY("GameId") REFERENCES "Games"("Id")
+);
+
+
+--Populate from existing records
+DELETE FROM PlayerStats;
+INSERT INTO PlayerStats (PlayerId, Wins, Matches, LastMatch)
+SELECT PlayerId, SUM(Won), COUNT(*), MAX(Date)
+FROM (
+	SELECT Player1Id AS PlayerId, WinnerId = Player1Id AS Won, Date FROM MatchRecords
+	UNION ALL
+	SELECT Player2Id AS PlayerId, WinnerId = Player2Id AS Won, Date FROM MatchRecords
+)
+GROUP BY PlayerId;
+
+DELETE FROM GameStats;
+INSERT INTO GameStats (GameId, Matches, LastMatch)
+SELECT GameId, COUNT(*), MAX(Date)
+FROM MatchRecords
+GROUP BY GameId;
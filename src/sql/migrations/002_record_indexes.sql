@@ -0,0 +1,16 @@
+----------------------------
+-- Migration 2: MatchRecords indexes
+-----------------------------
+
+--Per-game listings ordered by date, GameStats refresh
+CREATE INDEX IF NOT EXISTS "IdxRecordsGameDate" ON "MatchRecords" ("GameId", "Date");
+
+--Player filters and head-to-head lookups, Player2Id alone covers the OR branch
+CREATE INDEX IF NOT EXISTS "IdxRecordsPlayers" ON "MatchRecords" ("Player1Id", "Player2Id");
+CREATE INDEX IF NOT EXISTS "IdxRecordsPlayer2" ON "MatchRecords" ("Player2Id");
+
+--Win counts
+CREATE INDEX IF NOT EXISTS "IdxRecordsWinner" ON "MatchRecords" ("WinnerId");
+
+--Date range filters across all games
+CREATE INDEX IF NOT EXISTS "IdxRecordsDate" ON "MatchRecords" ("Date");
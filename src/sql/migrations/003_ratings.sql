@@ -0,0 +1,14 @@
+----------------------------
+-- Migration 3: Elo ratings, populated by Data after migrating
+-----------------------------
+
+--Create current rating per player per game, maintained by Data.record_match
+CREATE TABLE IF NOT EXISTS "Ratings" (
+	"PlayerId" INTEGER NOT NULL,
+	"GameId" INTEGER NOT NULL,
+	"Rating" REAL NOT NULL,
+	"Matches" INTEGER NOT NULL DEFAULT 0,
+	PRIMARY KEY("PlayerId", "GameId"),
+	FOREIGN KEY("PlayerId") REFERENCES "Players"("Id"),
+	FOREIGN KEY("GameId") REFERENCES "Games"("Id")
+);
@@ -0,0 +1,15 @@
+----------------------------
+-- Migration 4: Glicko-2 ratings, populated by Data after migrating
+-----------------------------
+
+--Create rating, deviation and volatility per player per game, recalculated by Data.rebuild_ratings
+CREATE TABLE IF NOT EXISTS "Glicko" (
+	"PlayerId" INTEGER NOT NULL,
+	"GameId" INTEGER NOT NULL,
+	"Rating" REAL NOT NULL,
+	"Deviation" REAL NOT NULL,
+	"Volatility" REAL NOT NULL,
+	PRIMARY KEY("PlayerId", "GameId"),
+	FOREIGN KEY("PlayerId") REFERENCES "Players"("Id"),
+	FOREIGN KEY("GameId") REFERENCES "Games"("Id")
+);
@@ -0,0 +1,29 @@
+----------------------------
+-- Migration 5: head-to-head summary table
+-----------------------------
+
+--Create per-game win counts for each pair of players, lower id first, maintained by Data.record_match
+CREATE TABLE IF NOT EXISTS "HeadToHead" (
+	"GameId" INTEGER NOT NULL,
+	"PlayerLow" INTEGER NOT NULL,
+	"PlayerHigh" INTEGER NOT NULL,
+	"LowWins" INTEGER NOT NULL DEFAULT 0,
+	"HighWins" INTEGER NOT NULL DEFAULT 0,
+	"LastMatch" DATETIME,
+	PRIMARY KEY("GameId", "PlayerLow", "PlayerHigh"),
+	FOREIGN KEY("GameId") REFERENCES "Games"("Id"),
+	FOREIGN KEY("PlayerLow") REFERENCES "Players"("Id"),
+	FOREIGN KEY("PlayerHigh") REFERENCES "Players"("Id")
+);
+
+--Lookups by the higher id player
+CREATE INDEX IF NOT EXISTS "IdxHeadToHeadHigh" ON "HeadToHead" ("PlayerHigh", "PlayerLow");
+
+
+--Populate from existing records
+DELETE FROM HeadToHead;
+INSERT INTO HeadToHead (GameId, PlayerLow, PlayerHigh, LowWins, HighWins, LastMatch)
+SELECT GameId, MIN(Player1Id, Player2Id), MAX(Player1Id, Player2Id),
+	SUM(WinnerId = MIN(Player1Id, Player2Id)), SUM(WinnerId = MAX(Player1Id, Player2Id)), MAX(Date)
+FROM MatchRecords
+GROUP BY GameId, MIN(Player1Id, Player2Id), MAX(Player1Id, Player2Id);
@@ -0,0 +1,14 @@
+----------------------------
+-- Migration 6: streak and form table, populated by Data after migrating
+-----------------------------
+
+--Create streaks per player per game, GameId 0 holds the player's overall streaks
+CREATE TABLE IF NOT EXISTS "Streaks" (
+	"PlayerId" INTEGER NOT NULL,
+	"GameId" INTEGER NOT NULL,
+	"Current" INTEGER NOT NULL DEFAULT 0,
+	"Longest" INTEGER NOT NULL DEFAULT 0,
+	"Form" TEXT NOT NULL DEFAULT '',
+	PRIMARY KEY("PlayerId", "GameId"),
+	FOREIGN KEY("PlayerId") REFERENCES "Players"("Id")
+);
@@ -0,0 +1,9 @@
+----------------------------
+-- Migration 7: Games whose Glicko-2 ratings are out of date
+-----------------------------
+
+--Recording or editing a match marks its game, Data.refresh_glicko replays marked games before ratings are read
+CREATE TABLE IF NOT EXISTS "GlickoStale" (
+	"GameId" INTEGER NOT NULL PRIMARY KEY,
+	FOREIGN KEY("GameId") REFERENCES "Games"("Id")
+);
@@ -0,0 +1,78 @@
+from src.rating import chronological
+
+
+class Streaks:
+    migration = 6 # Schema version that creates the Streaks table
+    overall = 0 # GameId used for streaks across all games
+    formLength = 5 # Number of recent results kept as a form string
+
+    def __init__(self, conn):
+        '''Win/loss streaks and recent form per player, overall and per game, stored in the Streaks table'''
+        self.db = conn
+        self.c = conn.cursor()
+
+
+    def play(self, state, key, won):
+        '''Updates state dict entry [current, longest, form] for key=(player, game) with one result'''
+        entry = state.setdefault(key, [0, 0, ''])
+        if won:
+            entry[0] = entry[0] + 1 if entry[0] > 0 else 1
+            entry[1] = max(entry[1], entry[0])
+        else:
+            entry[0] = entry[0] - 1 if entry[0] < 0 else -1
+        entry[2] = (entry[2] + ('W' if won else 'L'))[-self.formLength:]
+
+
+    def play_match(self, state, game, p1, p2, winner):
+        '''Applies one match to both players, for the game and overall'''
+        for p in (p1, p2):
+            self.play(state, (p, game), winner == p)
+            self.play(state, (p, self.overall), winner == p)
+
+
+    def save(self, state):
+        '''Writes state dict to the Streaks table, does not commit'''
+        self.c.executemany('INSERT OR REPLACE INTO Streaks (PlayerId, GameId, Current, Longest, Form) VALUES (?,?,?,?,?)',
+            [(key[0], key[1], e[0], e[1], e[2]) for key, e in state.items()])
+
+
+    def apply(self, records):
+        '''Applies converted match records, in order, on top of the stored streaks - does not commit'''
+        state = {}
+        for r in records:
+            for key in ((r['p1'], r['game']), (r['p2'], r['game']), (r['p1'], self.overall), (r['p2'], self.overall)):
+                if key not in state:
+                    self.c.execute('SELECT Current, Longest, Form FROM Streaks WHERE PlayerId = ? AND GameId = ?', key)
+                    row = self.c.fetchone()
+                    if row != None:
+                        state[key] = list(row)
+
+        for r in records:
+            self.play_match(state, r['game'], r['p1'], r['p2'], r['win'])
+
+        self.save(state)
+
+
+    def rebuild(self, players=None):
+        '''Recalculates streaks in one chronological pass, for a list of player ids or everyone - does not commit'''
+        state = {}
+        if players == None:
+            for recordId, g, p1, p2, winner, date in chronological(self.db):
+                self.play_match(state, g, p1, p2, winner)
+            self.c.execute('DELETE FROM Streaks')
+
+        else:
+            players = set(players)
+            cursor = self.db.cursor()
+            for p in players:
+                cursor.execute('''
+                    SELECT GameId, WinnerId FROM MatchRecords
+                    WHERE Player1Id = ? OR Player2Id = ?
+                    ORDER BY Date, Id''', (p, p))
+                for g, winner in cursor:
+                    self.play(state, (p, g), winner == p)
+                    self.play(state, (p, self.overall), winner == p)
+                self.c.execute('DELETE FROM Streaks WHERE PlayerId = ?', (p,))
+            cursor.close()
+
+        self.save(state)
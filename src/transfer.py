@@ -0,0 +1,368 @@
+import os, sys, csv, json, struct
+from array import array
+
+
+def create_missing(data, matches):
+    '''Adds players and games that do not exist yet, as MatchAddEntry does for match setup, returns list of (type, name) created'''
+    created = []
+    for match in matches:
+        if data.identities.game_status(match['game']) == None:
+            if data.validate_game_name(match['game']) == 0:
+                data.new_game(match['game'], "", "", "")
+                created.append(('game', match['game']))
+
+        for name in (match['p1'], match['p2']):
+            if data.identities.player_status(name) == None:
+                if data.validate_player_name(name) == 0:
+                    data.new_player(name)
+                    created.append(('player', name))
+
+    return created
+
+
+
+class MatchImporter:
+    # Accepted column names for each match field, compared lower-case
+    columns = {
+        'game': ('game',),
+        'p1': ('p1', 'player1', 'player 1'),
+        'p2': ('p2', 'player2', 'player 2'),
+        'win': ('win', 'winner'),
+        'date': ('date',),
+    }
+    maxErrors = 100 # Failed rows kept for reporting, the rest are only counted
+
+    def __init__(self, data, path, fmt=None, batchSize=5000):
+        '''Streams match rows from a CSV or JSONL file into the records table in batches'''
+        self.data = data
+        self.path = path
+        self.fmt = fmt if fmt else self.guess_format(path)
+        self.batchSize = batchSize
+
+        self.size = os.path.getsize(path)
+        self.bytesRead = 0
+        self.read = 0 # Rows read from file
+        self.imported = 0 # Rows written to records
+        self.failures = 0 # Rows rejected
+        self.errors = [] # (row number, row, message) for the first maxErrors failures
+        self.created = [] # (type, name) for entries added during import
+
+
+    def guess_format(self, path):
+        '''Returns 'csv' or 'jsonl' based on file extension'''
+        if os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson', '.json'):
+            return 'jsonl'
+        return 'csv'
+
+
+    def lines(self, binFile):
+        '''Yields decoded lines while tracking bytes read for progress'''
+        first = True
+        for raw in binFile:
+            self.bytesRead += len(raw)
+            line = raw.decode('utf-8')
+            if first: # Drop byte order mark left by spreadsheet exports
+                line = line.lstrip('\ufeff')
+                first = False
+            yield line
+
+
+    def normalize(self, row):
+        '''Maps a raw row dict onto match keys, returns None if any field is missing'''
+        lowered = {}
+        for key, value in row.items():
+            if key != None:
+                lowered[str(key).strip().lower()] = value
+
+        match = {}
+        for field, names in self.columns.items():
+            for n in names:
+                if lowered.get(n) not in (None, ''):
+                    match[field] = str(lowered[n]).strip()
+                    break
+            else:
+                return None
+
+        return match
+
+
+    def rows(self):
+        '''Yields (row number, raw row, match dict or None) for each row in the file
+
+        Raises ValueError for files that cannot be read at all: bad encoding, malformed CSV or missing columns'''
+        with open(self.path, 'rb') as binFile:
+            if self.fmt == 'jsonl':
+                for line in self.lines(binFile):
+                    if line.strip() == '':
+                        continue
+                    self.read += 1
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        yield self.read, line.strip(), None
+                        continue
+                    yield self.read, row, self.normalize(row) if isinstance(row, dict) else None
+
+            else:
+                try:
+                    reader = csv.DictReader(self.lines(binFile))
+                    missing = self.missing_columns(reader.fieldnames)
+                    if missing:
+                        raise ValueError('Missing column: ' + ', '.join(missing))
+
+                    for row in reader:
+                        self.read += 1
+                        yield self.read, row, self.normalize(row)
+                except csv.Error as e:
+                    raise ValueError('Malformed CSV: {}'.format(e))
+
+
+    def missing_columns(self, fieldnames):
+        '''Returns match fields with no accepted column in a CSV header, none for an empty file'''
+        if fieldnames == None:
+            return []
+        header = {str(name).strip().lower() for name in fieldnames if name != None}
+        return [field for field, names in self.columns.items() if not header.intersection(names)]
+
+
+    def current_row(self):
+        '''Returns the number of the row being read, for errors that stop the import'''
+        return self.read + 1
+
+
+    def batches(self):
+        '''Groups rows into lists of up to batchSize'''
+        batch = []
+        for entry in self.rows():
+            batch.append(entry)
+            if len(batch) >= self.batchSize:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
+
+
+    def fail(self, number, row, message):
+        '''Counts a rejected row, keeping details of the first few'''
+        self.failures += 1
+        if len(self.errors) < self.maxErrors:
+            self.errors.append((number, row, message))
+
+
+    def import_batch(self, batch):
+        '''Records one batch of rows, creating missing entries first'''
+        numbers, matches = [], []
+        for number, row, match in batch:
+            if match == None:
+                self.fail(number, row, 'Missing or unreadable fields')
+            else:
+                numbers.append((number, row))
+                matches.append(match)
+
+        self.created += create_missing(self.data, matches)
+        failed = self.data.record_matches(matches)
+
+        for index, match, message in failed:
+            self.fail(numbers[index][0], numbers[index][1], message)
+
+        self.imported += len(matches) - len(failed)
+
+
+    def steps(self):
+        '''Imports one batch per iteration, yielding progress as a fraction of the file read
+
+        Back-dated rows are replayed once after the last batch, or after a failure for the batches recorded'''
+        self.data.defer_replays()
+        try:
+            for batch in self.batches():
+                self.import_batch(batch)
+                yield self.progress()
+        finally:
+            self.data.replay_deferred()
+
+
+    def run(self, callback=None):
+        '''Imports the whole file, calling callback(importer) after each batch'''
+        for _ in self.steps():
+            if callback != None:
+                callback(self)
+
+        return self
+
+
+    def progress(self):
+        '''Returns fraction of the file processed'''
+        if self.size == 0:
+            return 1.0
+        return self.bytesRead / self.size
+
+
+    def summary(self):
+        '''Returns a short human-readable result'''
+        return '{} matches imported, {} rejected, {} entries created'.format(self.imported, self.failures, len(self.created))
+
+
+
+
+class MatchExporter:
+    formats = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl', '.gmc': 'columnar'}
+    magic = b'GMCOL1\n' # Header for the column-oriented binary format
+
+    def __init__(self, data, table, path, fmt=None, chunkSize=10000):
+        '''Streams 'records', 'players' or 'games' from the database to a CSV, JSONL or columnar file in chunks'''
+        self.data = data
+        self.table = table
+        self.path = path
+        self.fmt = fmt if fmt else self.formats.get(os.path.splitext(path)[1].lower(), 'csv')
+        self.chunkSize = chunkSize
+        self.written = 0 # Rows written to file
+
+
+    def chunks(self):
+        '''Yields (column names, list of rows) read from a dedicated cursor with fetchmany'''
+        cursor = self.data.query.export_cursor(self.table)
+        columns = [d[0] for d in cursor.description]
+
+        try:
+            rows = cursor.fetchmany(self.chunkSize)
+            yield columns, rows # Always at least one chunk, so empty tables still get a header
+            while rows:
+                rows = cursor.fetchmany(self.chunkSize)
+                if rows:
+                    yield columns, rows
+        finally:
+            cursor.close()
+
+
+    def write_csv(self, outFile, columns, rows, first):
+        '''Writes one chunk as CSV rows, with a header before the first chunk'''
+        writer = csv.writer(outFile)
+        if first:
+            writer.writerow(columns)
+        writer.writerows(rows)
+
+
+    def write_jsonl(self, outFile, columns, rows, first):
+        '''Writes one chunk as JSON objects, one per line'''
+        for row in rows:
+            outFile.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n')
+
+
+    def write_columnar(self, outFile, columns, rows, first):
+        '''Writes one chunk as a block of columns, see read_columnar for the layout'''
+        if first:
+            header = json.dumps({'table': self.table, 'columns': columns}).encode('utf-8')
+            outFile.write(self.magic + struct.pack('<I', len(header)) + header)
+
+        outFile.write(struct.pack('<I', len(rows)))
+        for i in range(len(columns)):
+            values = [r[i] for r in rows]
+            nulls = bytes(v == None for v in values)
+
+            if all(v == None or isinstance(v, int) for v in values): # Integer column
+                block = little_endian(array('q', [0 if v == None else v for v in values])).tobytes()
+                code = b'i'
+            else: # Text column, lengths followed by utf-8 data
+                encoded = [b'' if v == None else str(v).encode('utf-8') for v in values]
+                block = little_endian(array('I', [len(e) for e in encoded])).tobytes() + b''.join(encoded)
+                code = b's'
+
+            outFile.write(code + nulls + struct.pack('<I', len(block)) + block)
+
+
+    def steps(self):
+        '''Writes one chunk per iteration, yielding the total rows written so far'''
+        writers = {'csv': self.write_csv, 'jsonl': self.write_jsonl, 'columnar': self.write_columnar}
+        write = writers[self.fmt]
+
+        if self.fmt == 'columnar':
+            outFile = open(self.path, 'wb')
+        else:
+            outFile = open(self.path, 'w', encoding='utf-8', newline='')
+
+        with outFile:
+            first = True
+            for columns, rows in self.chunks():
+                write(outFile, columns, rows, first)
+                first = False
+                self.written += len(rows)
+                yield self.written
+
+
+    def run(self, callback=None):
+        '''Exports the whole table, calling callback(exporter) after each chunk'''
+        for _ in self.steps():
+            if callback != None:
+                callback(self)
+
+        return self
+
+
+    def summary(self):
+        '''Returns a short human-readable result'''
+        return '{} rows exported'.format(self.written)
+
+
+
+def export_matrix(data, game, path):
+    '''Writes the head-to-head matrix for a game id as CSV, cell (row, column) is wins of row player over column player'''
+    names, wins = data.query.head_to_head_matrix(game)
+    with open(path, 'w', encoding='utf-8', newline='') as outFile:
+        writer = csv.writer(outFile)
+        writer.writerow([''] + names)
+        for name, row in zip(names, wins):
+            writer.writerow([name] + row)
+
+    return len(names)
+
+
+def little_endian(values):
+    '''Byte-swaps an array in place on big-endian hosts so columnar files are portable'''
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def read_columnar(path):
+    '''Yields a dict of column name -> list of values for each block of a columnar export
+
+    Layout: magic, uint32 header length, JSON header with column names, then per block a uint32 row
+    count followed by each column as a type byte ('i' or 's'), one null flag byte per row, a uint32
+    data length and the data - int64 values, or uint32 lengths followed by utf-8 text'''
+    with open(path, 'rb') as inFile:
+        if inFile.read(len(MatchExporter.magic)) != MatchExporter.magic:
+            raise ValueError('Not a GrudgeMatch columnar file')
+
+        size = struct.unpack('<I', inFile.read(4))[0]
+        columns = json.loads(inFile.read(size).decode('utf-8'))['columns']
+
+        while True:
+            head = inFile.read(4)
+            if len(head) < 4:
+                break
+            count = struct.unpack('<I', head)[0]
+
+            block = {}
+            for name in columns:
+                code = inFile.read(1)
+                nulls = inFile.read(count)
+                size = struct.unpack('<I', inFile.read(4))[0]
+                raw = inFile.read(size)
+
+                if code == b'i':
+                    values = array('q')
+                    values.frombytes(raw)
+                    values = little_endian(values).tolist()
+                else:
+                    lengths = array('I')
+                    lengths.frombytes(raw[:4 * count])
+                    lengths = little_endian(lengths)
+                    values, offset = [], 4 * count
+                    for n in lengths:
+                        values.append(raw[offset:offset + n].decode('utf-8'))
+                        offset += n
+
+                block[name] = [None if nulls[i] else values[i] for i in range(count)]
+
+            yield block
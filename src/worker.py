@@ -0,0 +1,115 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class QueryExecutor:
+    def __init__(self, connect, workers=2):
+        '''Runs Query calls on background threads, each thread holding its own Query from connect()
+
+        With workers=0 calls run immediately on the calling thread, for databases that cannot be shared'''
+        self.connect = connect
+        self.local = threading.local()
+        self.pool = ThreadPoolExecutor(workers, 'query', self.init_worker) if workers > 0 else None
+
+
+    def init_worker(self):
+        '''Opens the worker thread's connection'''
+        self.local.query = self.connect()
+
+
+    def call(self, func, args):
+        '''Runs func(query, *args) with this thread's Query'''
+        return func(self.local.query, *args)
+
+
+    def submit(self, func, *args):
+        '''Schedules func(query, *args), returns a Future for its result'''
+        if self.pool != None:
+            return self.pool.submit(self.call, func, args)
+
+        future = Future()
+        try:
+            future.set_result(func(self.connect(), *args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+    def shutdown(self):
+        '''Stops the worker threads, dropping calls that have not started'''
+        if self.pool != None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+
+class Loader:
+    interval = 15 # Milliseconds between checks for finished futures
+
+    def __init__(self, widget, executor):
+        '''Delivers query results to callbacks on the Tk thread of widget, one pending load per key
+
+        A newer load for the same key, cancel(), or the widget being destroyed drops the older result'''
+        self.widget = widget
+        self.executor = executor
+        self.pending = {} # key=load key, value=(future, callback)
+        self.polling = False
+
+
+    def load(self, key, func, callback, *args):
+        '''Runs func(query, *args) in the background and calls callback(result) on the Tk thread'''
+        self.cancel(key)
+        self.pending[key] = (self.executor.submit(func, *args), callback)
+        if not self.polling:
+            self.polling = True
+            self.widget.after(self.interval, self.poll)
+
+
+    def loading(self, key):
+        '''Returns True while a load for key has not been delivered'''
+        return key in self.pending
+
+
+    def cancel(self, key=None):
+        '''Drops the pending load for key, or every pending load'''
+        keys = list(self.pending) if key == None else [key]
+        for k in keys:
+            if k in self.pending:
+                self.pending.pop(k)[0].cancel() # Only stops calls still queued, running ones are ignored
+
+
+    def poll(self):
+        '''Hands finished results to their callbacks, reschedules itself while loads are pending'''
+        from tkinter import TclError
+        try:
+            alive = self.widget.winfo_exists()
+        except TclError:
+            alive = False
+
+        if not alive:
+            self.cancel()
+            self.polling = False
+            return
+
+        try:
+            for key, (future, callback) in list(self.pending.items()):
+                if future.done() and self.pending.get(key) == (future, callback):
+                    del self.pending[key]
+                    try:
+                        callback(future.result())
+                    except Exception as e: # One failed load must not stop the others being delivered
+                        self.report(key, e)
+        finally:
+            if self.pending:
+                self.widget.after(self.interval, self.poll)
+            else:
+                self.polling = False
+
+
+    def report(self, key, error):
+        '''Shows a failed load or callback in an error pop-up over the widget's window'''
+        from tkinter import TclError
+        from src.message import Failure
+        try:
+            Failure(self.widget.winfo_toplevel(), 'Loading {} failed:\n{}'.format(key, error))
+        except TclError: # Window closed while the load was running
+            pass